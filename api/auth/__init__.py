@@ -1 +1,2 @@
 from .auth_handler import sign_jwt, decode_jwt
+from .middleware import JWTAuthMiddleware
@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from decouple import config
+from fastapi import HTTPException, status
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .auth_handler import decode_jwt
+
+
+# Remembers tokens whose signature already verified, so repeated calls from
+# the same session skip jwt.decode. Entries expire after the TTL or at the
+# token's own exp claim, whichever comes first.
+class VerifiedTokenCache:
+    def __init__(self, ttl: float = 300, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.tokens = OrderedDict()
+
+    def get(self, token: str) -> Optional[dict]:
+        cached = self.tokens.get(token)
+        if not cached:
+            return None
+
+        expires_at, payload = cached
+        if expires_at <= time.time():
+            del self.tokens[token]
+            return None
+
+        self.tokens.move_to_end(token)
+        return payload
+
+    def add(self, token: str, payload: dict):
+        expires_at = time.time() + self.ttl
+        if "exp" in payload:
+            expires_at = min(expires_at, payload["exp"])
+
+        self.tokens[token] = (expires_at, payload)
+        self.tokens.move_to_end(token)
+        while len(self.tokens) > self.max_size:
+            self.tokens.popitem(last=False)
+
+
+# Plain ASGI middleware: it only looks at the request headers and then hands
+# the untouched send/receive to the app, so streamed responses aren't wrapped.
+class JWTAuthMiddleware:
+    def __init__(self, app: ASGIApp, public_paths: set[str]):
+        self.app = app
+        self.public_paths = frozenset(public_paths)
+        self.token_cache = VerifiedTokenCache(
+            ttl=config("TOKEN_CACHE_TTL", default=300, cast=float),
+            max_size=config("TOKEN_CACHE_SIZE", default=10000, cast=int),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # if request is options, we don't need to verify the token
+        if scope["path"] in self.public_paths or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        payload = self.authenticate(scope)
+
+        if not payload:
+            response = Response(status_code=status.HTTP_401_UNAUTHORIZED)
+            return await response(scope, receive, send)
+
+        scope.setdefault("state", {})["payload"] = payload
+        await self.app(scope, receive, send)
+
+    def authenticate(self, scope: Scope) -> Optional[dict]:
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+
+        if not authorization:
+            return None
+
+        parts = authorization.split(" ")
+        if len(parts) < 2 or parts[1] == "undefined":
+            return None
+
+        token = parts[1]
+        payload = self.token_cache.get(token)
+        if payload:
+            return payload
+
+        try:
+            payload = decode_jwt(token)
+        except HTTPException:
+            return None
+
+        if payload:
+            self.token_cache.add(token, payload)
+
+        return payload
@@ -0,0 +1,12 @@
+from .indexes import ensure_indexes
+from .migrations import run_migrations
+from .documents import fail_interrupted_documents
+from .messages import (
+    append_message,
+    get_chat_messages,
+    get_recent_messages,
+    append_and_get_recent,
+    get_message_range,
+    delete_chat_messages,
+)
+from .user_profile_cache import UserProfileCache
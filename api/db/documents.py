@@ -0,0 +1,12 @@
+from datetime import datetime
+
+
+# Ingestion jobs only live in memory, so a document still marked processing
+# at startup lost its job to a restart or crash. Marking it failed lets the
+# next upload of the same file retry it instead of reporting a duplicate.
+async def fail_interrupted_documents(database) -> int:
+    result = await database["documents"].update_many(
+        {"status": "processing"},
+        {"$set": {"status": "failed", "failed_at": datetime.now()}},
+    )
+    return result.modified_count
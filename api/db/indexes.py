@@ -0,0 +1,64 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Indexes for every hot lookup: users by email on login and generation,
+# users by accessible_docs when a document is deleted, chats by owner in the
+# sidebar and admin listings, messages by chat in sequence order, documents
+# by content hash on upload.
+MONGO_INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("accessible_docs", ASCENDING)], name="accessible_docs"),
+    ],
+    "chats": [
+        IndexModel(
+            [("user_email", ASCENDING), ("created_at", ASCENDING)],
+            name="user_email_created_at",
+        ),
+    ],
+    "messages": [
+        IndexModel(
+            [("chat_id", ASCENDING), ("seq", ASCENDING)],
+            name="chat_id_seq_unique",
+            unique=True,
+        ),
+    ],
+    "documents": [
+        IndexModel(
+            [("content_hash", ASCENDING)],
+            name="content_hash_unique",
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}},
+        ),
+    ],
+}
+
+
+async def ensure_indexes(database) -> dict:
+    report = {"created": [], "existing": [], "failed": []}
+
+    for collection_name, indexes in MONGO_INDEXES.items():
+        collection = database[collection_name]
+        existing_keys = [
+            [tuple(field) for field in index["key"]]
+            for index in (await collection.index_information()).values()
+        ]
+
+        for index in indexes:
+            name = f"{collection_name}.{index.document['name']}"
+            key = list(index.document["key"].items())
+
+            if key in existing_keys:
+                report["existing"].append(name)
+                continue
+
+            # A unique index can't be built while duplicates exist; report it
+            # instead of refusing to start.
+            try:
+                await collection.create_indexes([index])
+                report["created"].append(name)
+            except OperationFailure as e:
+                print(f"Could not create index {name}:", e)
+                report["failed"].append(name)
+
+    return report
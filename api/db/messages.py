@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from decouple import config
+from pymongo import ReturnDocument
+
+# When enabled, messages are stored one document per message in the messages
+# collection instead of being pushed onto the chat document, so long chats
+# aren't bounded by the 16 MB document limit.
+SEPARATE_MESSAGES_COLLECTION = config(
+    "SEPARATE_MESSAGES_COLLECTION", default=False, cast=bool
+)
+
+
+# Everything but the embedded messages. The $slice is added next to it per
+# query; listing the fields keeps the projection an inclusion one.
+CHAT_FIELDS = {
+    "title": 1,
+    "user_email": 1,
+    "message_count": 1,
+    "external_count": 1,
+    "summary": 1,
+    "summarized_count": 1,
+    "created_at": 1,
+}
+
+
+# Appends a single message with one atomic write and returns it, or None if
+# the chat doesn't exist. message_count doubles as the sequence number and
+# external_count counts the messages kept outside the chat document.
+async def append_message(
+    database, chat_id: str, sender: str, message: str
+) -> Optional[dict]:
+    message = {"sender": sender, "message": message}
+
+    if not SEPARATE_MESSAGES_COLLECTION:
+        result = await database["chats"].update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$push": {"messages": message}, "$inc": {"message_count": 1}},
+        )
+        return message if result.matched_count else None
+
+    chat = await database["chats"].find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {"$inc": {"message_count": 1, "external_count": 1}},
+        projection={"message_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not chat:
+        return None
+
+    await database["messages"].insert_one(
+        {
+            "chat_id": ObjectId(chat_id),
+            "seq": chat["message_count"],
+            "created_at": datetime.now(),
+            **message,
+        }
+    )
+    return message
+
+
+# Chats hold their embedded messages first; anything beyond that count lives
+# in the messages collection.
+async def get_chat_messages(database, chat: dict) -> list[dict]:
+    messages = list(chat.get("messages", []))
+
+    if len(messages) >= chat.get("message_count", 0):
+        return messages
+
+    cursor = (
+        database["messages"]
+        .find(
+            {"chat_id": chat["_id"], "seq": {"$gt": len(messages)}},
+            {"_id": 0, "sender": 1, "message": 1},
+        )
+        .sort("seq", 1)
+    )
+    messages.extend(await cursor.to_list(length=None))
+    return messages
+
+
+# Loads the chat with only its last `limit` messages, so the work per turn
+# doesn't depend on how long the conversation is. With user_email only a chat
+# owned by that user is found.
+async def get_recent_messages(
+    database, chat_id: str, limit: int, user_email: Optional[str] = None
+) -> tuple[Optional[dict], list[dict]]:
+    query = {"_id": ObjectId(chat_id)}
+    if user_email is not None:
+        query["user_email"] = user_email
+
+    chat = await database["chats"].find_one(
+        query, {**CHAT_FIELDS, "messages": {"$slice": -limit}}
+    )
+    if not chat:
+        return None, []
+
+    return chat, await complete_window(database, chat, limit)
+
+
+# Takes the embedded $slice of a chat loaded with a -limit projection and tops
+# it up from the messages collection when newer messages live there. Only
+# chats that have messages outside the document pay for the extra query.
+async def complete_window(database, chat: dict, limit: int) -> list[dict]:
+    messages = chat.pop("messages", [])
+
+    if chat.get("external_count", 0) > 0:
+        cursor = (
+            database["messages"]
+            .find({"chat_id": chat["_id"]}, {"_id": 0, "sender": 1, "message": 1})
+            .sort("seq", -1)
+            .limit(limit)
+        )
+        newest = await cursor.to_list(length=limit)
+        messages = (messages + list(reversed(newest)))[-limit:]
+
+    return messages
+
+
+# Appends a message to a chat owned by user_email and returns the chat with
+# its last `limit` messages, the new one included. With embedded messages
+# this is a single round trip.
+async def append_and_get_recent(
+    database, chat_id: str, user_email: str, sender: str, message: str, limit: int
+) -> tuple[Optional[dict], list[dict]]:
+    message = {"sender": sender, "message": message}
+    if SEPARATE_MESSAGES_COLLECTION:
+        update = {"$inc": {"message_count": 1, "external_count": 1}}
+    else:
+        update = {"$inc": {"message_count": 1}, "$push": {"messages": message}}
+
+    chat = await database["chats"].find_one_and_update(
+        {"_id": ObjectId(chat_id), "user_email": user_email},
+        update,
+        projection={**CHAT_FIELDS, "messages": {"$slice": -limit}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not chat:
+        return None, []
+
+    if SEPARATE_MESSAGES_COLLECTION:
+        await database["messages"].insert_one(
+            {
+                "chat_id": chat["_id"],
+                "seq": chat["message_count"],
+                "created_at": datetime.now(),
+                **message,
+            }
+        )
+
+    return chat, await complete_window(database, chat, limit)
+
+
+# Messages [start, end) of the chat by position, used to fold older turns into
+# the chat summary.
+async def get_message_range(database, chat_id: str, start: int, end: int) -> list[dict]:
+    if end <= start:
+        return []
+
+    chat = await database["chats"].find_one(
+        {"_id": ObjectId(chat_id)},
+        {"messages": {"$slice": [start, end - start]}, "message_count": 1},
+    )
+    if not chat:
+        return []
+
+    messages = chat.get("messages", [])
+
+    # Embedded messages occupy the first positions and seq is 1-based, so
+    # whatever the slice didn't cover is in the messages collection.
+    if len(messages) < end - start and chat.get("message_count", 0) > start:
+        cursor = (
+            database["messages"]
+            .find(
+                {
+                    "chat_id": chat["_id"],
+                    "seq": {"$gt": start + len(messages), "$lte": end},
+                },
+                {"_id": 0, "sender": 1, "message": 1},
+            )
+            .sort("seq", 1)
+        )
+        messages = messages + await cursor.to_list(length=None)
+
+    return messages
+
+
+async def delete_chat_messages(database, chat_ids: list) -> None:
+    await database["messages"].delete_many(
+        {"chat_id": {"$in": [ObjectId(chat_id) for chat_id in chat_ids]}}
+    )
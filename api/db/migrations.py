@@ -0,0 +1,68 @@
+from datetime import datetime
+
+
+async def backfill_chat_created_at(database):
+    # ObjectIds embed their creation time, so chats saved without created_at
+    # still sort correctly on the user_email + created_at index.
+    await database["chats"].update_many(
+        {"created_at": {"$exists": False}},
+        [{"$set": {"created_at": {"$toDate": "$_id"}}}],
+    )
+
+
+async def backfill_chat_message_count(database):
+    # message_count is the sequence number for appended messages, it has to
+    # match the embedded messages of chats created before it existed.
+    await database["chats"].update_many(
+        {"message_count": {"$exists": False}},
+        [{"$set": {"message_count": {"$size": {"$ifNull": ["$messages", []]}}}}],
+    )
+
+
+async def backfill_chat_external_count(database):
+    # Messages beyond the embedded ones were written to the messages
+    # collection before external_count was tracked.
+    await database["chats"].update_many(
+        {"external_count": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "external_count": {
+                        "$subtract": [
+                            {"$ifNull": ["$message_count", 0]},
+                            {"$size": {"$ifNull": ["$messages", []]}},
+                        ]
+                    }
+                }
+            }
+        ],
+    )
+
+
+# Applied in order, each one at most once; applied names are recorded in the
+# migrations collection.
+MIGRATIONS = [
+    ("backfill_chat_created_at", backfill_chat_created_at),
+    ("backfill_chat_message_count", backfill_chat_message_count),
+    ("backfill_chat_external_count", backfill_chat_external_count),
+]
+
+
+async def run_migrations(database) -> list[str]:
+    applied = {
+        migration["name"]
+        async for migration in database["migrations"].find({}, {"name": 1})
+    }
+
+    ran = []
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+
+        await migration(database)
+        await database["migrations"].insert_one(
+            {"name": name, "applied_at": datetime.now()}
+        )
+        ran.append(name)
+
+    return ran
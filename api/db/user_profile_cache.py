@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from qdrant_client.http import models as rest
+
+
+def build_document_filter(accessible_docs: list) -> Optional[rest.Filter]:
+    if "all" in accessible_docs:
+        return None
+
+    return rest.Filter(
+        must=[
+            rest.FieldCondition(
+                key="metadata.document_id",  # Ensure the path to metadata is correct
+                match=rest.MatchAny(
+                    any=accessible_docs,
+                ),
+            )
+        ]
+    )
+
+
+# Keeps the parts of a user the generation path needs, keyed by email, so a
+# chat turn doesn't go to MongoDB for them. Anything that changes the prompt
+# or document access must call invalidate(); the TTL bounds staleness for
+# writes that bypass this process.
+class UserProfileCache:
+    def __init__(self, ttl: float = 60, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.profiles = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, database, email: str) -> Optional[dict]:
+        cached = self.profiles.get(email)
+        if cached and cached[0] > time.monotonic():
+            self.profiles.move_to_end(email)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        user = await database["users"].find_one(
+            {"email": email},
+            {"prompt": 1, "role": 1, "accessible_docs": 1, "preferred_model": 1},
+        )
+        if not user:
+            self.profiles.pop(email, None)
+            return None
+
+        accessible_docs = user.get("accessible_docs", [])
+        profile = {
+            "_id": user["_id"],
+            "email": email,
+            "prompt": user.get("prompt", ""),
+            "role": user.get("role"),
+            "accessible_docs": accessible_docs,
+            "qdrant_filter": build_document_filter(accessible_docs),
+            "preferred_model": user.get("preferred_model"),
+        }
+
+        self.profiles[email] = (time.monotonic() + self.ttl, profile)
+        self.profiles.move_to_end(email)
+        while len(self.profiles) > self.max_size:
+            self.profiles.popitem(last=False)
+
+        return profile
+
+    def invalidate(self, email: str):
+        self.profiles.pop(email, None)
+
+    def invalidate_all(self):
+        self.profiles.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.profiles),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
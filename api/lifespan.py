@@ -6,7 +6,36 @@ from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from contextlib import asynccontextmanager
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
+
+from db import (
+    ensure_indexes,
+    run_migrations,
+    fail_interrupted_documents,
+    UserProfileCache,
+)
+from model_inference import (
+    get_qa_chain,
+    SemanticAnswerCache,
+    ANSWER_CACHE_ENABLED,
+    LLMScheduler,
+    LLMPool,
+    GenerationRegistry,
+)
+from vectordb_handle import (
+    CachedQueryEmbeddings,
+    IngestionJobQueue,
+    ensure_payload_indexes,
+)
+
+
+# Payload indexes only take effect on a Qdrant server, the embedded on-disk
+# mode accepts and ignores them.
+def create_qdrant_client() -> QdrantClient:
+    qdrant_url = config("QDRANT_URL", default="")
+    if qdrant_url:
+        return QdrantClient(url=qdrant_url)
+
+    return QdrantClient(path=config("VECTOR_DOC_DB_PATH"))
 
 
 @asynccontextmanager
@@ -23,12 +52,27 @@ async def lifespan(app: FastAPI):
     else:
         print("Connected to database")
 
+    migrations = await run_migrations(app.database)
+    if migrations:
+        print("Applied migrations:", ", ".join(migrations))
+
+    interrupted = await fail_interrupted_documents(app.database)
+    if interrupted:
+        print(f"Marked {interrupted} interrupted document ingestions as failed")
+
+    app.index_report = await ensure_indexes(app.database)
+    print("MongoDB indexes created:", app.index_report["created"] or "none")
+
+    app.user_profiles = UserProfileCache(
+        ttl=config("USER_CACHE_TTL", default=60, cast=float),
+        max_size=config("USER_CACHE_SIZE", default=10000, cast=int),
+    )
+
     # Startup event
-    vectordb_path = config("VECTOR_DOC_DB_PATH")
     collection_name = config("COLLECTION_NAME")
 
     print("Creating Qdrant client")
-    client = QdrantClient(path=vectordb_path)
+    client = create_qdrant_client()
 
     if client.collection_exists(collection_name):
         print(f"Collection {collection_name} already exists. Using the existing one.")
@@ -39,11 +83,24 @@ async def lifespan(app: FastAPI):
             vectors_config=VectorParams(size=384, distance=Distance.COSINE),
         )
 
+    created_indexes = ensure_payload_indexes(client, collection_name)
+    if created_indexes:
+        print("Created payload indexes:", ", ".join(created_indexes))
+
     app.client = client
     print("Qdrant client created")
 
     print("Creating embeddings")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings = CachedQueryEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name="all-MiniLM-L6-v2",
+            encode_kwargs={
+                "batch_size": config("EMBEDDING_BATCH_SIZE", default=128, cast=int)
+            },
+        ),
+        max_size=config("EMBEDDING_CACHE_SIZE", default=1024, cast=int),
+    )
+    app.embeddings = embeddings
     print("Embeddings created")
 
     print("Creating vector store")
@@ -55,19 +112,32 @@ async def lifespan(app: FastAPI):
     app.vector_store = vector_store
     print("Vector store created")
 
+    app.ingestion_jobs = IngestionJobQueue(
+        workers=config("INGESTION_WORKERS", default=2, cast=int)
+    )
+    app.ingestion_jobs.start()
+
     # print("Creating retriever")
     # retriever = vector_store.as_retriever(
     #     search_type="similarity", search_kwargs={"k": 10, "score_threshold": 0.2}
     # )
     # print("Retriever created")
 
-    print("Creating Llama")
-    llm = ChatOllama(model="llama3.1", num_ctx=8192)
-    app.llm = llm
-    print("LLm created")
+    print("Creating LLM pool")
+    app.llm_pool = LLMPool()
+    await app.llm_pool.check_health()
+    app.llm_pool.start()
+    get_qa_chain(app.llm_pool.get_llm())
+    print("LLM pool created:", ", ".join(b.base_url for b in app.llm_pool.backends))
+
+    app.answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+    app.scheduler = LLMScheduler()
+    app.generations = GenerationRegistry()
 
     yield
 
+    await app.ingestion_jobs.stop()
+    await app.llm_pool.stop()
     app.mongodb_client.close()
     app.client.close()
 
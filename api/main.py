@@ -1,29 +1,59 @@
+import asyncio
 import json
+import uuid
+from contextlib import asynccontextmanager
 from fastapi import (
     Body,
     FastAPI,
+    HTTPException,
     Response,
     status,
     Request,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from bson import ObjectId
-from decouple import config
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as rest
 from langchain_core.vectorstores import VectorStoreRetriever
-from langchain_ollama import ChatOllama
 
-from model_inference import initialize_qa_chain
-from lifespan import lifespan
+from model_inference import (
+    get_qa_chain,
+    current_date,
+    get_context_string,
+    estimate_tokens,
+    HISTORY_WINDOW_MESSAGES,
+    update_chat_summary,
+    unsummarized_messages,
+    ROLLING_SUMMARY,
+    split_for_replay,
+    coalesce_tokens,
+    SchedulerFull,
+    UnknownModel,
+)
+from lifespan import lifespan, create_qdrant_client
 from models import Chat
-from auth import decode_jwt
+from db import append_message, get_recent_messages, append_and_get_recent
+from auth import decode_jwt, JWTAuthMiddleware
 from routers import auth, chats, documents, users, seed
+from utils import password_hashing_stats
+from decouple import config
 
 
 app = FastAPI(lifespan=lifespan)
 
+WS_AUTH_TIMEOUT = config("WS_AUTH_TIMEOUT", default=10, cast=float)
+
+# Strong references to fire-and-forget tasks, asyncio only keeps weak ones.
+background_tasks = set()
+
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,9 +64,9 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def verify_token(request, call_next):
-    allowed_paths = [
+app.add_middleware(
+    JWTAuthMiddleware,
+    public_paths={
         "/auth/register",
         "/auth/login",
         "/auth/can-create-admin-token",
@@ -45,34 +75,8 @@ async def verify_token(request, call_next):
         "/openapi.json",
         "/generate-response",
         "/health",
-    ]
-    if request.url.path in allowed_paths:
-        response = await call_next(request)
-        return response
-
-    # if request is options, we don't need to verify the token
-    if request.method == "OPTIONS":
-        response = await call_next(request)
-        return response
-
-    authorization = request.headers.get("Authorization")
-
-    if not authorization:
-        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-
-    token = authorization.split(" ")[1]
-
-    if token == "undefined":
-        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-
-    payload = decode_jwt(token)
-
-    if not payload:
-        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-
-    request.state.payload = payload
-
-    return await call_next(request)
+    },
+)
 
 
 @app.get("/")
@@ -100,12 +104,6 @@ async def add_message(
         chat = Chat(
             title=message[:10],
             user_email=user_email,
-            messages=[
-                {
-                    "sender": "human",
-                    "message": message,
-                }
-            ],
         )
 
         result = await app.database["chats"].insert_one(chat.model_dump())
@@ -118,125 +116,92 @@ async def add_message(
             response.status_code = status.HTTP_400_BAD_REQUEST
             return {"success": False, "message": "Could not create chat"}
 
+        chat_id = str(result.inserted_id)
+        await append_message(app.database, chat_id, "human", message)
+
         response.status_code = status.HTTP_201_CREATED
         return {
             "success": True,
             "message": "Chat created successfully",
-            "chat_id": str(result.inserted_id),
+            "chat_id": chat_id,
         }
 
-    # we need to update an existing chat
-    chat = await app.database["chats"].find_one({"_id": ObjectId(chat_id)})
+    # we need to update an existing chat, appending only the new message
+    # instead of rewriting the whole conversation
+    appended = await append_message(app.database, chat_id, "human", message)
 
-    if not chat:
+    if not appended:
         response.status_code = status.HTTP_404_NOT_FOUND
         return {"success": False, "message": "Chat not found"}
 
-    chat["messages"].append(
-        {
-            "sender": "human",
-            "message": message,
-        }
-    )
-
-    result = await app.database["chats"].update_one(
-        {"_id": ObjectId(chat_id)}, {"$set": chat}
-    )
-
-    if not result:
-        response.status_code = status.HTTP_400_BAD_REQUEST
-        return {"success": False, "message": "Could not update chat"}
-
-    if not result.acknowledged:
-        response.status_code = status.HTTP_400_BAD_REQUEST
-        return {"success": False, "message": "Could not update chat"}
-
     response.status_code = status.HTTP_200_OK
     return {"success": True, "message": "Chat updated successfully", "chat_id": chat_id}
 
 
-async def get_retriever_for_user(user_email: str) -> VectorStoreRetriever:
-    user = await app.database["users"].find_one(
-        {"email": user_email}, {"accessible_docs": 1}
-    )
-
-    accessible_docs = user.get("accessible_docs", [])
+def get_retriever_for_user(profile: dict) -> VectorStoreRetriever:
+    search_kwargs = {
+        "k": 5,
+        "score_threshold": 0.2,
+    }
 
-    if "all" in accessible_docs:
-        return app.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={
-                "k": 5,
-                "score_threshold": 0.2,
-            },
-        )
+    if profile["qdrant_filter"] is not None:
+        print("Accessible docs", profile["accessible_docs"])
+        search_kwargs["filter"] = profile["qdrant_filter"]
 
-    print("Accessible docs", accessible_docs)
     return app.vector_store.as_retriever(
         search_type="similarity",
-        search_kwargs={
-            "k": 5,
-            "score_threshold": 0.2,
-            "filter": rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="metadata.document_id",  # Ensure the path to metadata is correct
-                        match=rest.MatchAny(
-                            any=accessible_docs,
-                        ),
-                    )
-                ]
-            ),
-        },
+        search_kwargs=search_kwargs,
     )
 
 
-def get_context_string(length: int, chat: dict) -> str:
-    pairs = []
-    pair = []
-    for message in chat["messages"]:
-        if message['sender'] == 'human':
-            pair = [f"Human: `{message['message']}`"]
-        else:
-            pair.append(f"Assistant: `{message['message']}")
-
-        if len(pair) == 2:
-            pairs.append(pair)
-            pair = []
+def get_sources(documents: list) -> list[dict]:
+    sources = []
+    seen = set()
+    for document in documents:
+        metadata = document.metadata or {}
+        key = (metadata.get("document_id"), metadata.get("page"))
+        if key in seen:
+            continue
 
-    context_pairs = []
-    for pair in reversed(pairs):
-        context_pairs.append(pair)
-        if len(context_pairs) == length:
-            break
+        seen.add(key)
+        sources.append(
+            {
+                "document_id": metadata.get("document_id"),
+                "source": metadata.get("source"),
+                "page": metadata.get("page"),
+            }
+        )
 
-    context_pairs.reverse()
-    context_string = "\n".join([f"{a}\n{b}" for a, b in context_pairs])
-    return context_string
+    return sources
 
 
-async def generate_response(chat_id: str):
-    chat = await app.database["chats"].find_one({"_id": ObjectId(chat_id)})
-    if not chat:
-        return
-    
+# Yields (event, data) pairs; event is None for answer tokens. Transports turn
+# them into SSE frames.
+async def generate_response(
+    chat: dict, messages: list[dict], ticket, model: str = None
+):
+    chat_id = str(chat["_id"])
 
     user_email = chat["user_email"]
-    user = await app.database["users"].find_one({"email": user_email})
-    if not user:
+    profile = await app.user_profiles.get(app.database, user_email)
+    if not profile:
         return
 
-    prompt = ""
-    if "prompt" in user:
-        prompt = user["prompt"]
+    prompt = profile["prompt"]
+
+    context_string = get_context_string(unsummarized_messages(chat, messages))
+    retriever = get_retriever_for_user(profile)
 
-    context_length = 5
-    context_string = get_context_string(context_length, chat)
-    retriever = await get_retriever_for_user(chat["user_email"])
-    qa_chain = initialize_qa_chain(app.llm, retriever, prompt, context_string)
+    # A model asked for on the request wins over the user's saved choice; a
+    # saved model that was since removed from LLM_MODELS falls back to the
+    # default.
+    try:
+        model = app.llm_pool.resolve_model(model or profile.get("preferred_model"))
+    except UnknownModel:
+        model = app.llm_pool.default_model
 
     last_human_message = None
-    for message in reversed(chat["messages"]):
+    for message in reversed(messages):
         if message["sender"] == "human":
             last_human_message = message
             break
@@ -253,41 +218,197 @@ async def generate_response(chat_id: str):
     ):
         is_instructions = True
 
-        user["prompt"] += "\n" + last_human_message["message"].lower().replace(
+        prompt += "\n" + last_human_message["message"].lower().replace(
             "[note]", ""
         ).replace("[take note]", "").replace("[takenote]", "")
 
         result = await app.database["users"].update_one(
-            {"_id": ObjectId(user["_id"])}, {"$set": user}
+            {"_id": ObjectId(profile["_id"])}, {"$set": {"prompt": prompt}}
         )
+        app.user_profiles.invalidate(user_email)
 
         if not result.acknowledged:
-            yield f"data: {json.dumps({'chat_id': chat_id, 'partial_response': 'Unable to save your instructions. Please try again.'})}\n\n"
+            yield None, {
+                "chat_id": chat_id,
+                "partial_response": "Unable to save your instructions. Please try again.",
+            }
             return
-        yield f"data: {json.dumps({'chat_id': chat_id, 'partial_response': 'Provided instructions has been saved.'})}\n\n"
+        yield None, {
+            "chat_id": chat_id,
+            "partial_response": "Provided instructions has been saved.",
+        }
         return
 
     if is_instructions:
         return
 
     print("Generating response for:", last_human_message["message"])
-    print(retriever.invoke(last_human_message["message"]))
 
+    question = last_human_message["message"]
+
+    # Only standalone questions go through the answer cache, a follow-up
+    # depends on the conversation before it and can't be answered from
+    # another chat.
+    cache_key = None
+    if app.answer_cache and not context_string and not chat.get("summary"):
+        query_embedding = await app.embeddings.aembed_query(question)
+        cache_key = app.answer_cache.partition_key(
+            profile["accessible_docs"], prompt, model
+        )
+        cached = app.answer_cache.lookup(cache_key, query_embedding)
+
+        if cached:
+            print("Answer cache hit for:", question)
+            yield "sources", {"chat_id": chat_id, "sources": cached["sources"]}
+            for piece in split_for_replay(cached["answer"]):
+                yield None, {"chat_id": chat_id, "partial_response": piece}
+            return
+
+    # Retrieve once and reuse the documents for the prompt, the log and the
+    # citations instead of letting the chain run the same search again.
     try:
-        stream = qa_chain.stream(last_human_message["message"])
+        documents = await retriever.ainvoke(question)
     except Exception as e:
-        print("Error in generating response:", e)
+        print("Error in retrieving documents:", e)
 
         print("Recreating Qdrant client")
-        app.client = QdrantClient(path=config("VECTOR_DOC_DB_PATH"))
-        stream = qa_chain.stream(last_human_message["message"])
+        app.client = create_qdrant_client()
+        documents = await retriever.ainvoke(question)
+
+    print(documents)
+
+    # Named events are ignored by EventSource.onmessage, so clients that only
+    # read partial_response are unaffected.
+    sources = get_sources(documents)
+    yield "sources", {"chat_id": chat_id, "sources": sources}
+
+    # Waiting for a slot only starts once the prompt is ready; cache hits
+    # and saved instructions above never queue for the model.
+    async for position in app.scheduler.wait(ticket):
+        yield "queue", {"chat_id": chat_id, "position": position}
+
+    answer = []
+    with app.llm_pool.lease(model) as llm:
+        # astream keeps the Ollama token stream off the event loop, so other
+        # requests keep being served while this answer is generated.
+        stream = get_qa_chain(llm).astream(
+            {
+                "role_prompt": prompt,
+                "date": current_date(),
+                "summary": chat.get("summary", "") if ROLLING_SUMMARY else "",
+                "history": context_string,
+                "documents": documents,
+                "question": question,
+            }
+        )
+        async for chunk in stream:
+            answer.append(chunk)
+            yield None, {"chat_id": chat_id, "partial_response": chunk}
+
+    if cache_key:
+        app.answer_cache.store(cache_key, query_embedding, "".join(answer), sources)
+
 
-    for chunk in stream:
-        yield f"data: {json.dumps({'chat_id': chat_id, 'partial_response': chunk}).strip()}\n\n"
+# Holds the scheduler ticket for as long as the stream is open, the slot is
+# given back however the stream ends.
+async def release_when_done(ticket, stream):
+    try:
+        async for event in stream:
+            yield event
+    finally:
+        await stream.aclose()
+        app.scheduler.release(ticket)
+
+
+def sse_frame(event: str, data: dict, event_id: str = None) -> str:
+    frame = f"id: {event_id}\n" if event_id else ""
+    if event:
+        frame += f"event: {event}\n"
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+# The frontend renders <think> blocks of reasoning models as collapsible
+# divs, stored answers keep them collapsed.
+def format_for_storage(answer: str) -> str:
+    return (
+        answer.replace("<think>", "<div class='thinking' data-state='closed'>", 1)
+        .replace("</think>", "</div>", 1)
+        .strip()
+    )
+
+
+# Runs one chat turn to completion independently of any connection and
+# stores the answer with a single write, so closing the tab mid-stream no
+# longer loses it.
+async def run_generation(generation, ticket, chat, messages, model):
+    chat_id = generation.chat_id
+    answer = []
+
+    try:
+        try:
+            stream = generate_response(chat, messages, ticket, model)
+            events = coalesce_tokens(release_when_done(ticket, stream))
+            async for event, data in events:
+                if event is None:
+                    answer.append(data["partial_response"])
+                generation.add(event, data)
+        except asyncio.CancelledError:
+            # Closing the stream aborts the Ollama request. Only the registry
+            # cancels generations, anything else (shutdown) propagates.
+            if not generation.cancelled:
+                raise
+            print(f"Generation for chat {chat_id} cancelled")
+
+        generation.streaming = False
+
+        # A cancelled answer is stored as far as it got, the user saw it.
+        message = None
+        if answer:
+            message = await append_message(
+                app.database, chat_id, "ai", format_for_storage("".join(answer))
+            )
+            if ROLLING_SUMMARY:
+                run_in_background(summarize_chat(chat_id))
+
+        generation.add(
+            "done",
+            {
+                "chat_id": chat_id,
+                "success": True,
+                "cancelled": generation.cancelled,
+                "messageObject": message,
+            },
+        )
+    except Exception as e:
+        print(f"Generation for chat {chat_id} failed:", e)
+        generation.add(
+            "done",
+            {
+                "chat_id": chat_id,
+                "success": False,
+                "message": "Could not generate a response",
+            },
+        )
+    finally:
+        tokens = estimate_tokens("".join(answer)) if answer else 0
+        app.generations.finish(generation, tokens)
+
+
+async def follow_generation(generation, after: int = -1):
+    events = generation.follow(after)
+    try:
+        async for seq, event, data in events:
+            yield sse_frame(event, data, generation.event_id(seq))
+    finally:
+        # Counts the client as gone right away instead of whenever the
+        # inner generator is garbage collected.
+        await events.aclose()
 
 
 @app.get("/generate-response")
-async def bot_response(chat_id: str, token: str):
+async def bot_response(
+    request: Request, chat_id: str, token: str, model: str = None
+):
     payload = decode_jwt(token)
 
     if not payload:
@@ -302,14 +423,406 @@ async def bot_response(chat_id: str, token: str):
             content=json.dumps({"success": False, "message": "Chat id is required"}),
         )
 
-    chat = await app.database["chats"].find_one({"_id": ObjectId(chat_id)})
-    if not chat:
+    if not ObjectId.is_valid(chat_id):
+        return Response(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content=json.dumps({"success": False, "message": "Invalid chat id"}),
+        )
+
+    # EventSource sends Last-Event-ID when it reconnects. The answer is
+    # still being generated or sits in the buffer, so the stream resumes
+    # after the last event the client saw.
+    last_event_id = request.headers.get("last-event-id")
+    generation = app.generations.get(chat_id)
+    if generation and generation.user_email == payload["email"]:
+        after = generation.resume_after(last_event_id)
+        if after is not None or not generation.finished:
+            if after is not None:
+                app.generations.resumed += 1
+            return StreamingResponse(
+                follow_generation(generation, -1 if after is None else after),
+                media_type="text/event-stream",
+            )
+
+    # A reconnect for a generation that is no longer buffered: its answer
+    # is already stored, 204 tells EventSource to stop reconnecting.
+    if last_event_id:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    if model:
+        try:
+            app.llm_pool.resolve_model(model)
+        except UnknownModel as e:
+            return Response(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=json.dumps({"success": False, "message": str(e)}),
+            )
+
+    if not app.generations.claim(chat_id):
+        return Response(
+            status_code=status.HTTP_409_CONFLICT,
+            content=json.dumps(
+                {"success": False, "message": "A reply is already being generated"}
+            ),
+        )
+
+    try:
+        chat, messages = await get_recent_messages(
+            app.database, chat_id, HISTORY_WINDOW_MESSAGES, payload["email"]
+        )
+        if not chat:
+            return Response(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=json.dumps({"success": False, "message": "Chat not found"}),
+            )
+
+        try:
+            ticket = app.scheduler.admit(payload["email"])
+        except SchedulerFull as e:
+            return Response(
+                status_code=e.status_code,
+                content=json.dumps({"success": False, "message": e.message}),
+                headers={"Retry-After": "5"},
+            )
+
+        generation = app.generations.start(
+            chat_id,
+            payload["email"],
+            lambda generation: run_generation(
+                generation, ticket, chat, messages, model
+            ),
+        )
+    finally:
+        app.generations.unclaim(chat_id)
+
+    return StreamingResponse(
+        follow_generation(generation), media_type="text/event-stream"
+    )
+
+
+@app.post("/generate-response/cancel")
+async def cancel_generation(
+    request: Request, response: Response, chat_id: str = Body(..., embed=True)
+):
+    generation = app.generations.get(chat_id)
+
+    if not generation or generation.user_email != request.state.payload["email"]:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"success": False, "message": "No generation found for this chat"}
+
+    if not generation.cancel():
+        response.status_code = status.HTTP_409_CONFLICT
+        return {"success": False, "message": "Generation already finished"}
+
+    response.status_code = status.HTTP_200_OK
+    return {"success": True, "message": "Generation cancelled", "chat_id": chat_id}
+
+
+class ChatTurnError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+# Stores the human message and starts generating the answer. The chat is
+# read once, by the same write that appends the message, and handed down to
+# the generation instead of being loaded again. Shared by /chat-stream and
+# the WebSocket transport.
+async def start_chat_turn(
+    user_email: str, message: str, chat_id: str = None, model: str = None
+):
+    if chat_id is not None and not ObjectId.is_valid(chat_id):
+        raise ChatTurnError(status.HTTP_400_BAD_REQUEST, "Invalid chat id")
+
+    if model:
+        try:
+            app.llm_pool.resolve_model(model)
+        except UnknownModel as e:
+            raise ChatTurnError(status.HTTP_400_BAD_REQUEST, str(e))
+
+    # Claiming the chat and admission come first so a rejected turn doesn't
+    # leave an unanswered message in the chat.
+    if chat_id is not None and not app.generations.claim(chat_id):
+        raise ChatTurnError(
+            status.HTTP_409_CONFLICT, "A reply is already being generated"
+        )
+
+    try:
+        ticket = app.scheduler.admit(user_email)
+    except SchedulerFull as e:
+        app.generations.unclaim(chat_id)
+        raise ChatTurnError(e.status_code, e.message)
+
+    try:
+        if chat_id is None:
+            chat = Chat(
+                title=message[:10],
+                user_email=user_email,
+                messages=[{"sender": "human", "message": message}],
+                message_count=1,
+            ).model_dump()
+            result = await app.database["chats"].insert_one(chat)
+
+            if not result.acknowledged:
+                raise ChatTurnError(
+                    status.HTTP_400_BAD_REQUEST, "Could not create chat"
+                )
+
+            messages = chat.pop("messages")
+        else:
+            chat, messages = await append_and_get_recent(
+                app.database,
+                chat_id,
+                user_email,
+                "human",
+                message,
+                HISTORY_WINDOW_MESSAGES,
+            )
+
+            if not chat:
+                raise ChatTurnError(status.HTTP_404_NOT_FOUND, "Chat not found")
+    except BaseException:
+        app.scheduler.release(ticket)
+        app.generations.unclaim(chat_id)
+        raise
+
+    chat_id = str(chat["_id"])
+    generation = app.generations.start(
+        chat_id,
+        user_email,
+        lambda generation: run_generation(generation, ticket, chat, messages, model),
+    )
+    # The task only starts at the next await, so this is always the first
+    # event; new chats learn their id from it.
+    generation.add("chat", {"chat_id": chat_id, "title": chat["title"]})
+    return generation
+
+
+# One request per chat turn: stores the human message, streams the answer and
+# stores it, replacing /add-message, /generate-response and /update-chat.
+@app.post("/chat-stream")
+async def chat_stream(
+    request: Request,
+    message: str = Body(...),
+    chat_id: str = Body(None),
+    model: str = Body(None),
+):
+    try:
+        generation = await start_chat_turn(
+            request.state.payload["email"], message, chat_id, model
+        )
+    except ChatTurnError as e:
+        headers = {"Retry-After": "5"} if e.status_code in (429, 503) else None
         return Response(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content=json.dumps({"success": False, "message": "Chat not found"}),
+            status_code=e.status_code,
+            content=json.dumps({"success": False, "message": e.message}),
+            headers=headers,
         )
 
-    return StreamingResponse(generate_response(chat_id), media_type="text/event-stream")
+    return StreamingResponse(
+        follow_generation(generation), media_type="text/event-stream"
+    )
+
+
+# One socket per client carrying any number of chat turns. Commands are JSON:
+#   {"type": "auth", "token"}                          must be the first message
+#   {"type": "send", "message", "chat_id"?, "model"?, "stream_id"?}
+#   {"type": "cancel", "chat_id"}
+#   {"type": "resume", "chat_id", "last_event_id", "stream_id"?}
+# Every event of a generation is sent as {"type", "stream_id", "id", ...data}
+# with the same types and data as the SSE stream; tokens have type "message".
+# stream_id defaults to the chat id and lets a client tell several chats
+# apart, including new ones that don't have an id yet.
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    await websocket.accept()
+
+    # Browsers can't set headers on a WebSocket and a token in the URL ends
+    # up in logs, so it comes in the first message instead.
+    try:
+        command = json.loads(
+            await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT)
+        )
+        payload = None
+        if command.get("type") == "auth":
+            payload = decode_jwt(command["token"])
+    except (asyncio.TimeoutError, WebSocketDisconnect):
+        return
+    except (ValueError, KeyError, TypeError, AttributeError, HTTPException):
+        payload = None
+
+    if not payload:
+        await websocket.close(code=4401, reason="Unauthorized")
+        return
+
+    user_email = payload["email"]
+    send_lock = asyncio.Lock()
+    streams = {}
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def forward(stream_id: str, generation, after: int):
+        events = generation.follow(after)
+        try:
+            async for seq, event, data in events:
+                await send(
+                    {
+                        "type": event or "message",
+                        "stream_id": stream_id,
+                        "id": generation.event_id(seq),
+                        **data,
+                    }
+                )
+        finally:
+            await events.aclose()
+            if streams.get(stream_id) is asyncio.current_task():
+                del streams[stream_id]
+
+    def open_stream(stream_id: str, generation, after: int = -1):
+        previous = streams.pop(stream_id, None)
+        if previous:
+            previous.cancel()
+        streams[stream_id] = asyncio.create_task(forward(stream_id, generation, after))
+
+    async def send_error(stream_id, status_code: int, message: str):
+        await send(
+            {
+                "type": "error",
+                "stream_id": stream_id,
+                "status": status_code,
+                "message": message,
+            }
+        )
+
+    async def run_command(kind: str, command: dict, chat_id, stream_id: str):
+        if kind == "send":
+            message, model = command.get("message"), command.get("model")
+            if not message or not isinstance(message, str):
+                await send_error(
+                    stream_id, status.HTTP_400_BAD_REQUEST, "Message is required"
+                )
+                return
+
+            if model is not None and not isinstance(model, str):
+                await send_error(stream_id, status.HTTP_400_BAD_REQUEST, "Invalid model")
+                return
+
+            try:
+                generation = await start_chat_turn(user_email, message, chat_id, model)
+            except ChatTurnError as e:
+                await send_error(stream_id, e.status_code, e.message)
+                return
+
+            open_stream(stream_id, generation)
+
+        elif kind in ("cancel", "resume"):
+            generation = app.generations.get(chat_id) if chat_id else None
+            if not generation or generation.user_email != user_email:
+                await send_error(
+                    stream_id,
+                    status.HTTP_404_NOT_FOUND,
+                    "No generation found for this chat",
+                )
+                return
+
+            if kind == "cancel":
+                if not generation.cancel():
+                    await send_error(
+                        stream_id,
+                        status.HTTP_409_CONFLICT,
+                        "Generation already finished",
+                    )
+                return
+
+            last_event_id = command.get("last_event_id")
+            if not isinstance(last_event_id, str):
+                last_event_id = None
+            after = generation.resume_after(last_event_id)
+            if after is not None:
+                app.generations.resumed += 1
+            open_stream(stream_id, generation, -1 if after is None else after)
+
+        else:
+            await send_error(
+                stream_id, status.HTTP_400_BAD_REQUEST, f"Unknown command {kind}"
+            )
+
+    await send({"type": "ready", "email": user_email})
+
+    try:
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+                kind = command["type"]
+                chat_id = command.get("chat_id")
+                stream_id = command.get("stream_id")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                await send_error(None, status.HTTP_400_BAD_REQUEST, "Invalid command")
+                continue
+
+            if stream_id is not None and not isinstance(stream_id, str):
+                await send_error(None, status.HTTP_400_BAD_REQUEST, "Invalid stream id")
+                continue
+
+            if chat_id is not None and not (
+                isinstance(chat_id, str) and ObjectId.is_valid(chat_id)
+            ):
+                await send_error(
+                    stream_id, status.HTTP_400_BAD_REQUEST, "Invalid chat id"
+                )
+                continue
+
+            stream_id = stream_id or chat_id or uuid.uuid4().hex
+
+            # One bad command must not end the connection and every other
+            # stream on it.
+            try:
+                await run_command(kind, command, chat_id, stream_id)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"WebSocket command {kind!r} failed:", repr(e))
+                await send_error(
+                    stream_id,
+                    status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "Could not process command",
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Generations keep running for the cancel grace period, so a client
+        # that reconnects can resume them.
+        tasks = list(streams.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Summaries go through the scheduler like answers do, as background work
+# that only gets a slot while no user is waiting for one.
+@asynccontextmanager
+async def summary_llm():
+    ticket = app.scheduler.admit("summaries", background=True)
+    try:
+        async for _ in app.scheduler.wait(ticket):
+            pass
+
+        with app.llm_pool.lease() as llm:
+            yield llm
+    finally:
+        app.scheduler.release(ticket)
+
+
+# Runs as a background task nobody awaits, so failures are logged here; the
+# summary is simply retried after the next reply.
+async def summarize_chat(chat_id: str):
+    try:
+        await update_chat_summary(app.database, summary_llm, chat_id)
+    except Exception as e:
+        print(f"Could not summarize chat {chat_id}:", repr(e))
 
 
 @app.post("/update-chat")
@@ -326,21 +839,17 @@ async def update_chat(request: Request):
             ),
         )
 
-    message = {
-        "sender": "ai",
-        "message": full_message,
-    }
-
-    result = await app.database["chats"].update_one(
-        {"_id": ObjectId(chat_id)}, {"$push": {"messages": message}}
-    )
+    message = await append_message(app.database, chat_id, "ai", full_message)
 
-    if not result or not result.acknowledged:
+    if not message:
         return Response(
             status_code=status.HTTP_400_BAD_REQUEST,
             content=json.dumps({"success": False, "message": "Could not update chat"}),
         )
 
+    if ROLLING_SUMMARY:
+        run_in_background(summarize_chat(chat_id))
+
     return Response(
         status_code=status.HTTP_200_OK,
         content=json.dumps(
@@ -361,12 +870,50 @@ async def change_model(response: Response, request: Request):
     if model is None:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"success": False, "message": "Model is required"}
-    
 
-    app.llm = ChatOllama(model=model)
+    try:
+        model = app.llm_pool.resolve_model(model)
+    except UnknownModel as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"success": False, "message": str(e)}
+
+    # The choice is saved for the calling user only, other users keep theirs.
+    email = request.state.payload["email"]
+    result = await app.database["users"].update_one(
+        {"email": email}, {"$set": {"preferred_model": model}}
+    )
+    app.user_profiles.invalidate(email)
+
+    if not result.matched_count:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"success": False, "message": "User not found"}
+
     response.status_code = status.HTTP_200_OK
     return {"success": True, "message": f"Changed LLM model to {model}"}
 
+@app.get("/metrics")
+async def metrics(request: Request, response: Response):
+    payload = request.state.payload
+    if payload["role"] != "admin":
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+        return {"success": False, "message": "Unauthorized"}
+
+    return {
+        "success": True,
+        "message": "Metrics retrieved successfully",
+        "data": {
+            "embedding_cache": app.embeddings.stats(),
+            "user_profile_cache": app.user_profiles.stats(),
+            "password_hashing": password_hashing_stats(),
+            "answer_cache": app.answer_cache.stats() if app.answer_cache else None,
+            "llm_scheduler": app.scheduler.stats(),
+            "llm_pool": app.llm_pool.stats(),
+            "generations": app.generations.stats(),
+            "mongo_indexes": app.index_report,
+        },
+    }
+
+
 # A health endpoint
 @app.get("/health")
 async def health(response: Response):
@@ -1 +1,8 @@
-from .infer_model_chain import initialize_qa_chain
+from .infer_model_chain import initialize_qa_chain, get_qa_chain, current_date
+from .chat_history import get_context_string, estimate_tokens, HISTORY_WINDOW_MESSAGES
+from .summarize_chat import update_chat_summary, unsummarized_messages, ROLLING_SUMMARY
+from .answer_cache import SemanticAnswerCache, split_for_replay, ANSWER_CACHE_ENABLED
+from .scheduler import LLMScheduler, SchedulerFull
+from .llm_pool import LLMPool, UnknownModel
+from .generation_buffer import GenerationRegistry
+from .coalesce_tokens import coalesce_tokens
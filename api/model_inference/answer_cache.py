@@ -0,0 +1,141 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from decouple import config
+
+ANSWER_CACHE_ENABLED = config("ANSWER_CACHE_ENABLED", default=False, cast=bool)
+ANSWER_CACHE_SIZE = config("ANSWER_CACHE_SIZE", default=512, cast=int)
+ANSWER_CACHE_THRESHOLD = config("ANSWER_CACHE_THRESHOLD", default=0.95, cast=float)
+ANSWER_CACHE_TTL = config("ANSWER_CACHE_TTL", default=3600, cast=float)
+
+
+# Caches generated answers by question meaning. An answer is only reused for
+# a question whose embedding is within the similarity threshold and that was
+# asked with the same document access, role prompt, model and corpus
+# version, so it can't leak documents or instructions between users.
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_size: int = ANSWER_CACHE_SIZE,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.corpus_version = 0
+        self.entries = OrderedDict()
+        self.partitions = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def partition_key(self, accessible_docs: list, role_prompt: str, model: str) -> tuple:
+        return (
+            tuple(sorted(accessible_docs)),
+            hashlib.sha256(role_prompt.encode("utf-8")).hexdigest(),
+            model,
+            self.corpus_version,
+        )
+
+    def lookup(self, partition_key: tuple, embedding: list[float]) -> Optional[dict]:
+        entry_ids = self.partitions.get(partition_key)
+        if not entry_ids:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        for entry_id in [i for i in entry_ids if self.entries[i]["expires_at"] <= now]:
+            self.remove(entry_id)
+
+        entry_ids = self.partitions.get(partition_key)
+        if not entry_ids:
+            self.misses += 1
+            return None
+
+        query = normalize(embedding)
+        vectors = np.stack([self.entries[entry_id]["vector"] for entry_id in entry_ids])
+        similarities = vectors @ query
+        best = int(np.argmax(similarities))
+
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = entry_ids[best]
+        self.entries.move_to_end(entry_id)
+        self.hits += 1
+        return self.entries[entry_id]
+
+    def store(
+        self,
+        partition_key: tuple,
+        embedding: list[float],
+        answer: str,
+        sources: list[dict],
+    ):
+        # An answer generated before invalidate() was called belongs to a
+        # corpus version that no longer exists.
+        if partition_key[-1] != self.corpus_version or not answer.strip():
+            return
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = {
+            "partition_key": partition_key,
+            "vector": normalize(embedding),
+            "answer": answer,
+            "sources": sources,
+            "expires_at": time.monotonic() + self.ttl,
+        }
+        self.partitions.setdefault(partition_key, []).append(entry_id)
+
+        while len(self.entries) > self.max_size:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id)
+        entry_ids = self.partitions[entry["partition_key"]]
+        entry_ids.remove(entry_id)
+        if not entry_ids:
+            del self.partitions[entry["partition_key"]]
+
+    # Called whenever documents are added, replaced or deleted.
+    def invalidate(self):
+        self.corpus_version += 1
+        self.entries.clear()
+        self.partitions.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "corpus_version": self.corpus_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def normalize(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Splits a cached answer into word sized pieces so the replay streams like a
+# generated one.
+def split_for_replay(answer: str) -> list[str]:
+    return re.findall(r"\S+\s*|\s+", answer)
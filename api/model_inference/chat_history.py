@@ -0,0 +1,41 @@
+from decouple import config
+
+# Upper bound on messages loaded from MongoDB per turn, and the share of the
+# model context the previous turns may take in the prompt.
+HISTORY_WINDOW_MESSAGES = config("HISTORY_WINDOW_MESSAGES", default=20, cast=int)
+HISTORY_TOKEN_BUDGET = config("HISTORY_TOKEN_BUDGET", default=1500, cast=int)
+
+
+# A rough ~4 characters per token estimate, good enough for budgeting prompt
+# space without running the model's tokenizer.
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+# Builds the "Previous Chat Context" from the newest complete human/assistant
+# pairs that fit in the token budget.
+def get_context_string(
+    messages: list[dict], token_budget: int = HISTORY_TOKEN_BUDGET
+) -> str:
+    pairs = []
+    pair = []
+    for message in messages:
+        if message["sender"] == "human":
+            pair = [f"Human: `{message['message']}`"]
+        elif pair:
+            pair.append(f"Assistant: `{message['message']}`")
+
+        if len(pair) == 2:
+            pairs.append(f"{pair[0]}\n{pair[1]}")
+            pair = []
+
+    context_pairs = []
+    tokens = 0
+    for pair in reversed(pairs):
+        tokens += estimate_tokens(pair)
+        if tokens > token_budget:
+            break
+        context_pairs.append(pair)
+
+    context_pairs.reverse()
+    return "\n".join(context_pairs)
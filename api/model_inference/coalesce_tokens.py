@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from decouple import config
+
+# 0 for either disables coalescing.
+SSE_COALESCE_MS = config("SSE_COALESCE_MS", default=30, cast=float)
+SSE_COALESCE_BYTES = config("SSE_COALESCE_BYTES", default=256, cast=int)
+
+END = object()
+
+
+# Stops the upstream generator (and the LLM request behind it) when the
+# client goes away, cancelling the task reading it alone doesn't run its
+# cleanup if it is suspended at a yield.
+async def close_stream(events):
+    aclose = getattr(events, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+# Merges consecutive answer tokens of an (event, data) stream into one event
+# per time window or once max_bytes of text piled up, whichever comes first.
+# The first token is passed through immediately so time-to-first-token is
+# unchanged, and named events flush what is pending and go out as they are.
+async def coalesce_tokens(
+    events,
+    window_ms: float = SSE_COALESCE_MS,
+    max_bytes: int = SSE_COALESCE_BYTES,
+):
+    if window_ms <= 0 or max_bytes <= 0:
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await close_stream(events)
+        return
+
+    # A separate pump reads the LLM stream so a quiet model can't hold back
+    # tokens that are already pending past the window.
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(END)
+
+    pump_task = asyncio.create_task(pump())
+    window = window_ms / 1000
+    pending = []
+    pending_bytes = 0
+    pending_data = None
+    deadline = None
+    first_token = True
+
+    def flush():
+        nonlocal pending, pending_bytes, pending_data, deadline
+        merged = None, {**pending_data, "partial_response": "".join(pending)}
+        pending, pending_bytes, pending_data, deadline = [], 0, None, None
+        return merged
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+                continue
+
+            if isinstance(item, Exception):
+                raise item
+
+            if item is END:
+                if pending:
+                    yield flush()
+                return
+
+            event, data = item
+            if event is not None:
+                if pending:
+                    yield flush()
+                yield item
+                continue
+
+            if first_token:
+                first_token = False
+                yield item
+                continue
+
+            pending.append(data["partial_response"])
+            pending_bytes += len(data["partial_response"].encode("utf-8"))
+            pending_data = pending_data or data
+            deadline = deadline or time.monotonic() + window
+
+            if pending_bytes >= max_bytes:
+                yield flush()
+    finally:
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)
+        await close_stream(events)
@@ -0,0 +1,207 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+from decouple import config
+
+GENERATION_BUFFER_TTL = config("GENERATION_BUFFER_TTL", default=120, cast=float)
+# How long a generation keeps running with nobody reading it before it is
+# cancelled. Long enough for EventSource to reconnect and resume.
+GENERATION_CANCEL_GRACE = config("GENERATION_CANCEL_GRACE", default=10, cast=float)
+
+
+# Everything one generation has sent so far. The generation runs as its own
+# task and appends events here; any number of SSE connections follow it, so a
+# client that reconnects picks up where it left off instead of starting the
+# LLM again.
+class Generation:
+    def __init__(self, chat_id: str, user_email: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.chat_id = chat_id
+        self.user_email = user_email
+        self.events = []
+        self.finished = False
+        self.finished_at = None
+        self.changed = asyncio.Event()
+        self.task = None
+        self.followers = 0
+        self.cancelled = False
+        self.streaming = True
+        self.on_abandoned = None
+        self.cancel_timer = None
+
+    def add(self, event: Optional[str], data: dict):
+        self.events.append((event, data))
+        self.notify()
+
+    def finish(self):
+        self.finished = True
+        self.finished_at = time.monotonic()
+        self.notify()
+
+    # Each change gets a fresh Event so one follower clearing it can't make
+    # another one miss the wake-up.
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    # Stops the LLM stream; once the answer is complete and being stored it
+    # can no longer be cancelled.
+    def cancel(self) -> bool:
+        if self.cancelled or not self.streaming or not self.task:
+            return False
+
+        self.cancelled = True
+        self.task.cancel()
+        return True
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}:{seq}"
+
+    # Returns the sequence number a Last-Event-ID points at, or None when it
+    # belongs to another generation.
+    def resume_after(self, last_event_id: Optional[str]) -> Optional[int]:
+        if not last_event_id:
+            return None
+
+        generation_id, _, seq = last_event_id.partition(":")
+        if generation_id != self.id or not seq.isdigit():
+            return None
+
+        return int(seq)
+
+    # A client disconnecting shows up here as the follower being closed.
+    async def follow(self, after: int = -1):
+        self.followers += 1
+        try:
+            seq = after + 1
+            while True:
+                changed = self.changed
+                while seq < len(self.events):
+                    event, data = self.events[seq]
+                    yield seq, event, data
+                    seq += 1
+
+                if self.finished:
+                    return
+
+                await changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.finished and self.on_abandoned:
+                self.on_abandoned(self)
+
+
+class GenerationRegistry:
+    def __init__(
+        self,
+        ttl: float = GENERATION_BUFFER_TTL,
+        cancel_grace: float = GENERATION_CANCEL_GRACE,
+    ):
+        self.ttl = ttl
+        self.cancel_grace = cancel_grace
+        self.generations = {}
+        self.claimed = set()
+        self.resumed = 0
+        self.completed = 0
+        self.completed_tokens = 0
+        self.cancelled = 0
+        self.cancelled_by_disconnect = 0
+        self.tokens_before_cancel = 0
+        self.estimated_tokens_saved = 0
+
+    def get(self, chat_id: str) -> Optional[Generation]:
+        self.forget_expired()
+        return self.generations.get(chat_id)
+
+    # A chat runs one generation at a time. Turns claim the chat before their
+    # first await, so a concurrent turn can't slip in while the message is
+    # being stored; start() or unclaim() gives the claim up.
+    def claim(self, chat_id: str) -> bool:
+        generation = self.get(chat_id)
+        if chat_id in self.claimed or (generation and not generation.finished):
+            return False
+
+        self.claimed.add(chat_id)
+        return True
+
+    def unclaim(self, chat_id: str):
+        self.claimed.discard(chat_id)
+
+    def start(self, chat_id: str, user_email: str, run) -> Generation:
+        self.unclaim(chat_id)
+        generation = Generation(chat_id, user_email)
+        generation.on_abandoned = self.schedule_cancel
+        self.generations[chat_id] = generation
+        generation.task = asyncio.create_task(run(generation))
+        # Covers a client that goes away before it ever starts reading.
+        self.schedule_cancel(generation)
+        return generation
+
+    # Re-arming replaces the previous timer, so after a reconnect and another
+    # disconnect the generation always gets a full grace period.
+    def schedule_cancel(self, generation: Generation):
+        if generation.cancel_timer:
+            generation.cancel_timer.cancel()
+
+        generation.cancel_timer = asyncio.get_running_loop().call_later(
+            self.cancel_grace, self.cancel_if_abandoned, generation
+        )
+
+    def cancel_if_abandoned(self, generation: Generation):
+        generation.cancel_timer = None
+        if generation.followers or generation.finished:
+            return
+
+        if generation.cancel():
+            print(f"Cancelled generation for chat {generation.chat_id}, no client left")
+            self.cancelled_by_disconnect += 1
+
+    def cancel(self, chat_id: str) -> bool:
+        generation = self.generations.get(chat_id)
+        return bool(generation) and generation.cancel()
+
+    # Records how much was generated. A cancelled answer is assumed to have
+    # been headed for the average length of completed ones, the difference
+    # is what cancelling saved.
+    def finish(self, generation: Generation, tokens: int):
+        if generation.cancelled:
+            self.cancelled += 1
+            self.tokens_before_cancel += tokens
+            if self.completed:
+                average = self.completed_tokens / self.completed
+                self.estimated_tokens_saved += max(0, round(average) - tokens)
+        else:
+            self.completed += 1
+            self.completed_tokens += tokens
+
+        if generation.cancel_timer:
+            generation.cancel_timer.cancel()
+            generation.cancel_timer = None
+        generation.finish()
+
+    def forget_expired(self):
+        now = time.monotonic()
+        expired = [
+            chat_id
+            for chat_id, generation in self.generations.items()
+            if generation.finished and now - generation.finished_at > self.ttl
+        ]
+        for chat_id in expired:
+            del self.generations[chat_id]
+
+    def stats(self) -> dict:
+        self.forget_expired()
+        return {
+            "running": sum(not g.finished for g in self.generations.values()),
+            "buffered": len(self.generations),
+            "resumed": self.resumed,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "cancelled_by_disconnect": self.cancelled_by_disconnect,
+            "tokens_before_cancel": self.tokens_before_cancel,
+            "estimated_tokens_saved": self.estimated_tokens_saved,
+            "ttl": self.ttl,
+            "cancel_grace": self.cancel_grace,
+        }
@@ -1,5 +1,6 @@
 from langchain_ollama import ChatOllama
-from langchain.schema.runnable import RunnablePassthrough
+from operator import itemgetter
+from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
 from langchain.schema import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
 from datetime import datetime
@@ -8,41 +9,59 @@ def current_date() -> str:
     return datetime.now().strftime("%Y-%m-%d %A")
 
 
+RAG_TEMPLATE = """
+    Your role: ###{role_prompt}###
 
-def initialize_qa_chain(llm: ChatOllama, retriever, user_custom_prompt: str, context: str):
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    NOTE: For your information, present date is ### {date} ###
 
-    RAG_TEMPLATE = """
-    Your role: ###%s###
-
-    NOTE: For your information, present date is ### %s ###
-
-    You are an assistant designed for question-answering tasks. 
-    - Use the provided pieces of retrieved context to answer questions as accurately as possible. 
-    - When the context does not directly provide an answer, or when the question is unrelated to the context, 
-    - use your general knowledge to respond appropriately. 
+    You are an assistant designed for question-answering tasks.
+    - Use the provided pieces of retrieved context to answer questions as accurately as possible.
+    - When the context does not directly provide an answer, or when the question is unrelated to the context,
+    - use your general knowledge to respond appropriately.
     - Avoid referencing the retrieved context when it is irrelevant to the question.
-    
+
     <context>
-    ###Previous Chat Context: %s###
+    ###Summary of Earlier Conversation: {summary}###
+    ###Previous Chat Context: {history}###
     {context}
     </context>
 
     Answer the following question:
     {question}
-    """ % (user_custom_prompt, current_date(), context)
+    """
+
+# Parsed once; user supplied text only ever reaches it as variable values, so
+# braces in role prompts or messages can't break the template.
+RAG_PROMPT = ChatPromptTemplate.from_template(RAG_TEMPLATE)
+
+qa_chains = {}
+
 
-    rag_prompt = ChatPromptTemplate.from_template(RAG_TEMPLATE)
+def format_docs(docs) -> str:
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+# The chain expects {"role_prompt", "date", "summary", "history", "documents",
+# "question"}. Retrieval is done by the caller so the same documents can also
+# be logged and cited.
+def initialize_qa_chain(llm: ChatOllama):
     qa_chain = (
-        {
-            "context": retriever | format_docs,
-            "customPrompt": RunnablePassthrough(),
-            "question": RunnablePassthrough(),
-        }
-        | rag_prompt
+        RunnablePassthrough.assign(
+            context=itemgetter("documents") | RunnableLambda(format_docs)
+        )
+        | RAG_PROMPT
         | llm
         | StrOutputParser()
     )
 
     return qa_chain
+
+
+# Chains hold no per-request state, so one per model endpoint is built and
+# shared by every request.
+def get_qa_chain(llm: ChatOllama):
+    key = (llm.model, llm.base_url)
+    if key not in qa_chains:
+        qa_chains[key] = initialize_qa_chain(llm)
+
+    return qa_chains[key]
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from decouple import config, Csv
+from langchain_ollama import ChatOllama
+
+OLLAMA_BASE_URLS = config(
+    "OLLAMA_BASE_URLS", default="http://localhost:11434", cast=Csv()
+)
+# Empty allows any model a backend reports as pulled.
+LLM_MODELS = config("LLM_MODELS", default="", cast=Csv())
+DEFAULT_LLM_MODEL = config("DEFAULT_LLM_MODEL", default="llama3.1")
+LLM_NUM_CTX = config("LLM_NUM_CTX", default=8192, cast=int)
+LLM_HEALTH_INTERVAL = config("LLM_HEALTH_INTERVAL", default=15, cast=float)
+LLM_HEALTH_TIMEOUT = config("LLM_HEALTH_TIMEOUT", default=2, cast=float)
+
+
+# Errors that say the backend itself is unreachable or stuck. Anything else,
+# such as Ollama's ResponseError for a bad request, is the request's fault and
+# leaves the backend in rotation.
+BACKEND_ERRORS = (httpx.TransportError, ConnectionError, TimeoutError)
+
+
+class UnknownModel(Exception):
+    pass
+
+
+# Ollama reports pulled models with their tag, "llama3.1" is "llama3.1:latest".
+def model_tag(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+class Backend:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.models = None
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.llms = {}
+
+    def serves(self, model: str) -> bool:
+        # Until the first health check answers, assume the model is there.
+        return self.models is None or model_tag(model) in self.models
+
+    def get_llm(self, model: str) -> ChatOllama:
+        if model not in self.llms:
+            self.llms[model] = ChatOllama(
+                model=model, base_url=self.base_url, num_ctx=LLM_NUM_CTX
+            )
+
+        return self.llms[model]
+
+    def to_dict(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "models": sorted(self.models) if self.models is not None else None,
+        }
+
+
+# Spreads generations over several Ollama servers. Each request goes to the
+# healthy backend with the fewest requests in flight among those that have
+# the model pulled; a periodic GET /api/tags ejects backends that are down or
+# answer slower than the health timeout and brings them back once they recover.
+class LLMPool:
+    def __init__(
+        self,
+        base_urls: list[str] = OLLAMA_BASE_URLS,
+        models: list[str] = LLM_MODELS,
+        default_model: str = DEFAULT_LLM_MODEL,
+        health_interval: float = LLM_HEALTH_INTERVAL,
+        health_timeout: float = LLM_HEALTH_TIMEOUT,
+    ):
+        self.backends = [Backend(base_url) for base_url in base_urls]
+        self.models = models
+        self.default_model = default_model
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.health_task = None
+
+    # Checks a requested model against LLM_MODELS and against the models the
+    # backends reported in their last health check. Before any backend has
+    # answered there is nothing to check against, so the name is allowed.
+    def resolve_model(self, model: Optional[str]) -> str:
+        model = model or self.default_model
+        if self.models and model not in self.models:
+            raise UnknownModel(f"Model {model} is not available")
+
+        reported = [b.models for b in self.backends if b.models is not None]
+        if reported and not any(model_tag(model) in models for models in reported):
+            raise UnknownModel(f"Model {model} is not available on any backend")
+
+        return model
+
+    def pick(self, model: str) -> Backend:
+        candidates = [b for b in self.backends if b.serves(model)] or self.backends
+        healthy = [b for b in candidates if b.healthy]
+
+        # With every backend ejected, trying one beats failing outright.
+        return min(healthy or candidates, key=lambda b: b.outstanding)
+
+    # Yields a ChatOllama bound to the chosen backend; the backend counts as
+    # busy until the block exits. A connection error or timeout while the
+    # lease is held ejects the backend until the next health check.
+    @contextmanager
+    def lease(self, model: Optional[str] = None):
+        model = self.resolve_model(model)
+        backend = self.pick(model)
+        backend.outstanding += 1
+        backend.requests += 1
+
+        try:
+            yield backend.get_llm(model)
+        except BACKEND_ERRORS:
+            backend.failures += 1
+            backend.healthy = False
+            raise
+        finally:
+            backend.outstanding -= 1
+
+    # For work that doesn't need balancing, such as building chains up front.
+    def get_llm(self, model: Optional[str] = None) -> ChatOllama:
+        model = self.resolve_model(model)
+        return self.pick(model).get_llm(model)
+
+    async def check_backend(self, client: httpx.AsyncClient, backend: Backend):
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"{backend.base_url}/api/tags")
+            response.raise_for_status()
+            backend.models = {model["name"] for model in response.json()["models"]}
+            backend.latency = round(time.perf_counter() - started, 3)
+            backend.healthy = True
+        except Exception as e:
+            if backend.healthy:
+                print(f"Ejecting LLM backend {backend.base_url}:", repr(e))
+            backend.healthy = False
+
+    async def check_health(self):
+        async with httpx.AsyncClient(timeout=self.health_timeout) as client:
+            await asyncio.gather(
+                *(self.check_backend(client, backend) for backend in self.backends)
+            )
+
+    async def health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        self.health_task = asyncio.create_task(self.health_loop())
+
+    async def stop(self):
+        if self.health_task:
+            self.health_task.cancel()
+            await asyncio.gather(self.health_task, return_exceptions=True)
+            self.health_task = None
+
+    def stats(self) -> dict:
+        return {
+            "default_model": self.default_model,
+            "models": self.models or None,
+            "backends": [backend.to_dict() for backend in self.backends],
+        }
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from decouple import config
+
+LLM_MAX_CONCURRENCY = config("LLM_MAX_CONCURRENCY", default=2, cast=int)
+LLM_MAX_QUEUE = config("LLM_MAX_QUEUE", default=32, cast=int)
+LLM_MAX_PER_USER = config("LLM_MAX_PER_USER", default=2, cast=int)
+
+
+class SchedulerFull(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class Ticket:
+    def __init__(self, user: str, background: bool = False):
+        self.user = user
+        self.background = background
+        self.waiting = False
+        self.granted = False
+        self.released = False
+        self.moved = asyncio.Event()
+        self.queued_at = time.perf_counter()
+
+
+# Admission control in front of the LLM. At most max_concurrency generations
+# run at once; the rest wait in per-user queues that are served round-robin,
+# so a user with many open chats can't push everyone else to the back.
+# Background work such as chat summaries only gets a slot when no user is
+# waiting for one.
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_per_user: int = LLM_MAX_PER_USER,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.running = 0
+        self.preparing = 0
+        self.queues = OrderedDict()
+        self.background = deque()
+        self.queued = 0
+        self.per_user = {}
+        self.admitted = 0
+        self.rejected_per_user = 0
+        self.rejected_queue_full = 0
+        self.total_wait = 0.0
+        self.dispatched = 0
+
+    # Raises SchedulerFull straight away instead of letting the request wait,
+    # so callers can answer with 429/503 before any stream is opened. The
+    # ticket doesn't hold a slot yet, that only happens in wait().
+    def admit(self, user: str, background: bool = False) -> Ticket:
+        if not background and self.per_user.get(user, 0) >= self.max_per_user:
+            self.rejected_per_user += 1
+            raise SchedulerFull(429, "Too many generations in progress for this user")
+
+        admitted = self.running + self.preparing + self.queued
+        if admitted >= self.max_concurrency + self.max_queue:
+            self.rejected_queue_full += 1
+            raise SchedulerFull(503, "The model is busy, please try again shortly")
+
+        ticket = Ticket(user, background)
+        if not background:
+            self.per_user[user] = self.per_user.get(user, 0) + 1
+        self.preparing += 1
+        self.admitted += 1
+        return ticket
+
+    # Queues the ticket for a slot, yields its queue position every time it
+    # changes, and returns once the ticket holds a slot.
+    async def wait(self, ticket: Ticket):
+        if not ticket.waiting and not ticket.released:
+            ticket.waiting = True
+            ticket.queued_at = time.perf_counter()
+            self.preparing -= 1
+            if ticket.background:
+                self.background.append(ticket)
+            else:
+                self.queues.setdefault(ticket.user, deque()).append(ticket)
+            self.queued += 1
+            self.dispatch()
+
+        while not ticket.granted:
+            yield self.position(ticket)
+            ticket.moved.clear()
+            await ticket.moved.wait()
+
+    # Safe to call more than once and for tickets that never got a slot, it
+    # runs from the generator's finally block whatever happened to the stream.
+    def release(self, ticket: Ticket):
+        if ticket.released:
+            return
+
+        ticket.released = True
+        if not ticket.background:
+            self.per_user[ticket.user] -= 1
+            if not self.per_user[ticket.user]:
+                del self.per_user[ticket.user]
+
+        if ticket.granted:
+            self.running -= 1
+        elif not ticket.waiting:
+            self.preparing -= 1
+        elif ticket.background:
+            self.background.remove(ticket)
+            self.queued -= 1
+        else:
+            queue = self.queues[ticket.user]
+            queue.remove(ticket)
+            self.queued -= 1
+            if not queue:
+                del self.queues[ticket.user]
+
+        self.dispatch()
+
+    def dispatch(self):
+        changed = False
+        while self.running < self.max_concurrency and (self.queues or self.background):
+            if self.queues:
+                user, queue = next(iter(self.queues.items()))
+                ticket = queue.popleft()
+
+                # The user goes to the back of the rotation.
+                del self.queues[user]
+                if queue:
+                    self.queues[user] = queue
+            else:
+                ticket = self.background.popleft()
+
+            self.queued -= 1
+            ticket.granted = True
+            self.running += 1
+            self.dispatched += 1
+            self.total_wait += time.perf_counter() - ticket.queued_at
+            ticket.moved.set()
+            changed = True
+
+        if changed:
+            for queue in [*self.queues.values(), self.background]:
+                for ticket in queue:
+                    ticket.moved.set()
+
+    # 1-based number of tickets dispatched before this one if nothing else
+    # arrives: every user ahead in the rotation gets one more turn per round,
+    # and background tickets come after all of them.
+    def position(self, ticket: Ticket) -> int:
+        if ticket.granted:
+            return 0
+
+        if ticket.background:
+            return self.queued - len(self.background) + self.background.index(ticket) + 1
+
+        position = 0
+        rounds = None
+        for user, queue in self.queues.items():
+            if user == ticket.user:
+                rounds = queue.index(ticket)
+                break
+
+        ahead = True
+        for user, queue in self.queues.items():
+            if user == ticket.user:
+                ahead = False
+                continue
+            position += min(len(queue), rounds + 1 if ahead else rounds)
+
+        return position + rounds + 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_per_user": self.max_per_user,
+            "running": self.running,
+            "preparing": self.preparing,
+            "queued": self.queued,
+            "queued_background": len(self.background),
+            "admitted": self.admitted,
+            "rejected_per_user": self.rejected_per_user,
+            "rejected_queue_full": self.rejected_queue_full,
+            "average_wait_seconds": (
+                self.total_wait / self.dispatched if self.dispatched else 0.0
+            ),
+        }
@@ -0,0 +1,90 @@
+from typing import Callable
+
+from bson import ObjectId
+from decouple import config
+from langchain.prompts import ChatPromptTemplate
+from langchain.schema import StrOutputParser
+from langchain_ollama import ChatOllama
+
+from db import get_message_range
+
+# The newest messages always stay verbatim in the prompt; older ones are
+# folded into the summary once at least SUMMARY_BATCH_MESSAGES of them piled
+# up, so the summarizer runs every few turns rather than after each reply.
+ROLLING_SUMMARY = config("ROLLING_SUMMARY", default=True, cast=bool)
+SUMMARY_KEEP_MESSAGES = config("SUMMARY_KEEP_MESSAGES", default=6, cast=int)
+SUMMARY_BATCH_MESSAGES = config("SUMMARY_BATCH_MESSAGES", default=6, cast=int)
+
+SUMMARY_TEMPLATE = """
+    You maintain a running summary of a conversation between a human and an assistant.
+
+    Current summary:
+    {summary}
+
+    New messages to fold into the summary:
+    {conversation}
+
+    Write the updated summary in at most 200 words. Keep names, numbers,
+    decisions, the human's preferences and any open questions. Only output the summary.
+    """
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
+
+
+async def summarize_messages(llm: ChatOllama, summary: str, messages: list[dict]) -> str:
+    conversation = "\n".join(
+        f"{'Human' if message['sender'] == 'human' else 'Assistant'}: {message['message']}"
+        for message in messages
+    )
+
+    chain = SUMMARY_PROMPT | llm | StrOutputParser()
+    return (
+        await chain.ainvoke(
+            {"summary": summary or "(empty)", "conversation": conversation}
+        )
+    ).strip()
+
+
+# Folds messages that dropped out of the verbatim window into the chat's
+# persisted summary. Runs in the background after a reply has been stored.
+# acquire_llm is an async context manager yielding the model, it is only
+# entered when there is something to summarize.
+async def update_chat_summary(database, acquire_llm: Callable, chat_id: str):
+    chat = await database["chats"].find_one(
+        {"_id": ObjectId(chat_id)},
+        {"summary": 1, "summarized_count": 1, "message_count": 1},
+    )
+    if not chat:
+        return
+
+    summarized_count = chat.get("summarized_count", 0)
+    fold_until = chat.get("message_count", 0) - SUMMARY_KEEP_MESSAGES
+
+    if fold_until - summarized_count < SUMMARY_BATCH_MESSAGES:
+        return
+
+    messages = await get_message_range(database, chat_id, summarized_count, fold_until)
+    if not messages:
+        return
+
+    async with acquire_llm() as llm:
+        summary = await summarize_messages(llm, chat.get("summary", ""), messages)
+
+    # Only the first summarizer to finish for this range wins, a concurrent
+    # run that started from the same summarized_count is dropped.
+    await database["chats"].update_one(
+        {"_id": chat["_id"], "summarized_count": chat.get("summarized_count")},
+        {"$set": {"summary": summary, "summarized_count": fold_until}},
+    )
+    print(f"Summarized {fold_until} messages of chat {chat_id}")
+
+
+# Drops messages from the loaded window that are already covered by the
+# summary. The window holds the last len(messages) of message_count messages.
+def unsummarized_messages(chat: dict, messages: list[dict]) -> list[dict]:
+    if not ROLLING_SUMMARY:
+        return messages
+
+    first_position = chat.get("message_count", len(messages)) - len(messages)
+    skip = chat.get("summarized_count", 0) - first_position
+    return messages[max(0, skip) :]
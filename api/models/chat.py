@@ -6,4 +6,8 @@ class Chat(BaseModel):
     title: str = Field(default_factory=str)
     user_email: str = Field(...)
     messages: list[dict] = Field(default_factory=list)
+    message_count: int = Field(default=0)
+    external_count: int = Field(default=0)
+    summary: str = Field(default_factory=str)
+    summarized_count: int = Field(default=0)
     created_at: datetime = Field(default_factory=datetime.now)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Response, status, Body, Request, Form
+from pymongo.errors import DuplicateKeyError
 from models.user import User
-from utils import hash_password
+from utils import hash_password_async, verify_password
 from auth import sign_jwt
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -25,9 +26,16 @@ async def register(user: User, request: Request, response: Response):
             "message": "User already exists, try logging in instead",
         }
 
-    user.password = hash_password(user.password)
+    user.password = await hash_password_async(user.password)
     user.accessible_docs = ["all"]
-    result = await app.database["users"].insert_one(user.model_dump())
+    try:
+        result = await app.database["users"].insert_one(user.model_dump())
+    except DuplicateKeyError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "message": "User already exists, try logging in instead",
+        }
 
     if not result:
         return {"success": False, "message": "Could not create user"}
@@ -63,7 +71,7 @@ async def login_user(
         response.status_code = status.HTTP_401_UNAUTHORIZED
         return {"success": False, "message": "Invalid credentials"}
 
-    if not user["password"] == hash_password(password):
+    if not await verify_password(password, user["password"]):
         response.status_code = status.HTTP_401_UNAUTHORIZED
         return {"success": False, "message": "Invalid credentials"}
 
@@ -101,7 +109,7 @@ async def change_name(request: Request, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"success": False, "message": "User not found"}
 
-    if not user["password"] == hash_password(body["password"]):
+    if not await verify_password(body["password"], user["password"]):
         response.status_code = status.HTTP_401_UNAUTHORIZED
         return {"success": False, "message": "Invalid credentials"}
 
@@ -142,11 +150,11 @@ async def change_password(request: Request, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"success": False, "message": "User not found"}
 
-    if not user["password"] == hash_password(body["currentPassword"]):
+    if not await verify_password(body["currentPassword"], user["password"]):
         response.status_code = status.HTTP_401_UNAUTHORIZED
         return {"success": False, "message": "Invalid credentials"}
 
-    new_password = hash_password(body["newPassword"])
+    new_password = await hash_password_async(body["newPassword"])
 
     result = await app.database["users"].update_one(
         {"email": payload["email"]}, {"$set": {"password": new_password}}
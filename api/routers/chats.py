@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Response, status, Request
 from bson import ObjectId
 
+from db import get_chat_messages, delete_chat_messages
+
 
 router = APIRouter(prefix="/chats", tags=["Chats"])
 
@@ -34,7 +36,8 @@ async def get_chats(
 
     chats = (
         await app.database["chats"]
-        .find({"user_email": user_email})
+        .find({"user_email": user_email}, {"messages": 0})
+        .sort("created_at", 1)
         .skip(page * limit)
         .limit(limit)
         .to_list(length=limit)
@@ -66,7 +69,8 @@ async def get_chat_ids(request: Request, response: Response):
 
     chats = (
         await app.database["chats"]
-        .find({"user_email": user_email})
+        .find({"user_email": user_email}, {"title": 1})
+        .sort("created_at", 1)
         .to_list(length=1000)
     )
 
@@ -97,7 +101,7 @@ async def get_chat(request: Request, response: Response, chat_id: str):
     chat = {
         "_id": str(chat["_id"]),
         "title": chat["title"],
-        "messages": chat["messages"],
+        "messages": await get_chat_messages(app.database, chat),
         "user_email": chat["user_email"],
     }
 
@@ -118,6 +122,7 @@ async def delete_chat(request: Request, response: Response, chat_id: str):
         return {"success": False, "message": "Chat not found"}
 
     result = await app.database["chats"].delete_one({"_id": ObjectId(chat_id)})
+    await delete_chat_messages(app.database, [chat_id])
 
     if not result:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -215,7 +220,7 @@ async def get_single_chat(request: Request, response: Response, chat_id: str):
     chat = {
         "_id": str(chat["_id"]),
         "title": chat["title"],
-        "messages": chat["messages"],
+        "messages": await get_chat_messages(app.database, chat),
         "user_email": chat["user_email"],
     }
 
@@ -10,15 +10,53 @@ from fastapi import (
 )
 from fastapi.responses import FileResponse
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 from decouple import config
-import time
-
-from vectordb_handle import upsert_pdf_to_qdrant, delete_document_from_qdrant
+from functools import partial
+import asyncio
+import hashlib
+import os
+import uuid
+
+from vectordb_handle import (
+    upsert_pdf_to_qdrant,
+    replace_pdf_in_qdrant,
+    delete_document_from_qdrant,
+    get_payload_index_status,
+)
 
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
+UPLOAD_DIRECTORY = "uploaded_documents"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+# Streams the upload to disk in fixed-size chunks while hashing it, so memory
+# use doesn't grow with the file. Files are stored under their SHA-256 so the
+# same bytes always land at the same path.
+async def store_upload(file: UploadFile) -> tuple[str, str]:
+    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+
+    temp_location = f"{UPLOAD_DIRECTORY}/{uuid.uuid4().hex}.part"
+    content_hash = hashlib.sha256()
+
+    try:
+        with open(temp_location, "wb") as file_obj:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                content_hash.update(chunk)
+                file_obj.write(chunk)
+    except Exception:
+        os.remove(temp_location)
+        raise
+
+    content_hash = content_hash.hexdigest()
+    file_location = f"{UPLOAD_DIRECTORY}/{content_hash}.pdf"
+    os.replace(temp_location, file_location)
+
+    return file_location, content_hash
+
 
 @router.get("/count")
 async def get_documents_count(request: Request, response: Response):
@@ -39,6 +77,37 @@ async def get_documents_count(request: Request, response: Response):
     }
 
 
+@router.get("/indexes")
+async def get_index_status(request: Request, response: Response):
+    app = request.app
+
+    # if it's admin, allow else return unauthorized
+    payload = request.state.payload
+    if payload["role"] != "admin":
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+        return {"success": False, "message": "Unauthorized"}
+
+    indexes = await asyncio.to_thread(
+        get_payload_index_status, app.client, config("COLLECTION_NAME")
+    )
+
+    # The embedded on-disk Qdrant accepts payload indexes but never builds
+    # them, so without QDRANT_URL every field reports indexed: false.
+    embedded = not config("QDRANT_URL", default="")
+    message = "Index status retrieved successfully"
+    if embedded:
+        message += (
+            ". Embedded Qdrant does not support payload indexes, "
+            "set QDRANT_URL to use a Qdrant server"
+        )
+
+    return {
+        "success": True,
+        "message": message,
+        "data": {"mode": "embedded" if embedded else "server", "indexes": indexes},
+    }
+
+
 @router.get("/")
 async def get_documents(
     request: Request, response: Response, page: int = 0, limit: int = 10
@@ -99,58 +168,148 @@ async def create_document(
 
     print("File name:", file.filename)
 
-    import os
-
-    # Create the directory if it doesn't exist
-    if not os.path.exists("uploaded_documents"):
-        os.makedirs("uploaded_documents")
-
     # Save file to disk
-    file_location = f"uploaded_documents/{time.time()}{file.filename}"
-    with open(file_location, "wb+") as file_obj:
-        file_obj.write(await file.read())
+    file_location, content_hash = await store_upload(file)
 
     print("File saved to:", file_location)
 
-    # Create document in MongoDB
-    document = {
-        "title": title,
-        "file_path": file_location,
-        "created_at": datetime.now(),
-    }
+    # Identical bytes were already ingested, reuse their chunks and vectors
+    # instead of parsing and embedding the file again.
+    existing_document = await app.database["documents"].find_one(
+        {"content_hash": content_hash}
+    )
 
-    result = await app.database["documents"].insert_one(document)
+    if existing_document and existing_document.get("status") != "failed":
+        print("Duplicate of document:", existing_document["_id"])
 
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Could not create document"
-        )
+        response.status_code = status.HTTP_200_OK
+        return {
+            "success": True,
+            "message": "Document already exists",
+            "data": {
+                "_id": str(existing_document["_id"]),
+                "title": existing_document["title"],
+                "status": existing_document.get("status", "ready"),
+                "duplicate": True,
+                "created_at": existing_document["created_at"],
+            },
+        }
 
-    if not result.acknowledged:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Could not create document"
+    if existing_document:
+        # The earlier ingestion of these bytes failed, it is retried on the
+        # same record. Matching on the status keeps two retries from racing.
+        print("Retrying failed document:", existing_document["_id"])
+
+        document = {
+            "title": title,
+            "file_path": file_location,
+            "status": "processing",
+        }
+        result = await app.database["documents"].update_one(
+            {"_id": existing_document["_id"], "status": "failed"}, {"$set": document}
         )
 
-    document_id = str(result.inserted_id)
+        if not result.modified_count:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Document is already being processed",
+            )
+
+        document["created_at"] = existing_document["created_at"]
+        document_id = str(existing_document["_id"])
+    else:
+        # Create document in MongoDB
+        document = {
+            "title": title,
+            "file_path": file_location,
+            "content_hash": content_hash,
+            "status": "processing",
+            "created_at": datetime.now(),
+        }
+
+        try:
+            result = await app.database["documents"].insert_one(document)
+        except DuplicateKeyError:
+            # The same bytes were uploaded concurrently and the other request won
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Document already exists",
+            )
+
+        if not result:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not create document",
+            )
+
+        if not result.acknowledged:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not create document",
+            )
+
+        document_id = str(result.inserted_id)
 
-    print("Uploading to Qdrant")
-    upsert_pdf_to_qdrant(app.vector_store, file_location, document_id)
-    print("Uploaded to Qdrant")
+    async def set_document_status(job):
+        await app.database["documents"].update_one(
+            {"_id": ObjectId(job.document_id)},
+            {"$set": {"status": "ready" if job.status == "completed" else "failed"}},
+        )
+
+        # Even a failed job may have written some chunks, either way cached
+        # answers were generated without them.
+        if app.answer_cache:
+            app.answer_cache.invalidate()
+
+    # Parsing and embedding a large PDF takes minutes, so it is queued and
+    # the client polls /documents/jobs/{job_id} instead of waiting.
+    job = app.ingestion_jobs.submit(
+        document_id,
+        title,
+        partial(upsert_pdf_to_qdrant, app.vector_store, file_location, document_id),
+        on_finish=set_document_status,
+    )
+    print("Queued for Qdrant upload, job:", job.id)
 
     document = {
         "_id": document_id,
         "title": title,
+        "status": document["status"],
+        "job_id": job.id,
         "created_at": document["created_at"],
     }
 
-    response.status_code = status.HTTP_201_CREATED
+    response.status_code = status.HTTP_202_ACCEPTED
     return {
         "success": True,
-        "message": "Document created successfully",
+        "message": "Document accepted for processing",
         "data": document,
     }
 
 
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, request: Request, response: Response):
+    app = request.app
+
+    # Check authorization
+    payload = request.state.payload
+    if payload["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
+        )
+
+    job = app.ingestion_jobs.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return {
+        "success": True,
+        "message": "Job retrieved successfully",
+        "data": job.to_dict(),
+    }
+
+
 @router.get("/{document_id}")
 async def get_document(document_id: str, request: Request, response: Response):
     app = request.app
@@ -186,6 +345,129 @@ async def get_document(document_id: str, request: Request, response: Response):
     )
 
 
+@router.put("/{document_id}")
+async def replace_document(
+    document_id: str,
+    request: Request,
+    response: Response,
+    title: str = Form(None),
+    file: UploadFile = File(...),
+):
+    app = request.app
+
+    # Check authorization
+    payload = request.state.payload
+    if payload["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
+        )
+
+    # Validate file type
+    if file.content_type != "application/pdf":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Only PDF files are allowed"
+        )
+
+    document = await app.database["documents"].find_one({"_id": ObjectId(document_id)})
+
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
+        )
+
+    # Two ingestion jobs on the same document would race on its chunks.
+    if document.get("status") == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed",
+        )
+
+    file_location, content_hash = await store_upload(file)
+
+    if content_hash == document.get("content_hash"):
+        return {
+            "success": True,
+            "message": "Document is unchanged",
+            "data": {"_id": document_id, "title": document["title"]},
+        }
+
+    duplicate = await app.database["documents"].find_one(
+        {"content_hash": content_hash, "_id": {"$ne": ObjectId(document_id)}}
+    )
+
+    if duplicate:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Same file is already uploaded as {duplicate['_id']}",
+        )
+
+    previous_file_path = document.get("file_path")
+    update = {
+        "file_path": file_location,
+        "content_hash": content_hash,
+        "status": "processing",
+        "updated_at": datetime.now(),
+    }
+    if title:
+        update["title"] = title
+
+    # Matching on the status also covers a replacement that started while
+    # this upload was being stored.
+    result = await app.database["documents"].update_one(
+        {"_id": ObjectId(document_id), "status": {"$ne": "processing"}},
+        {"$set": update},
+    )
+
+    if not result or not result.acknowledged:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Could not update document"
+        )
+
+    if not result.matched_count:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed",
+        )
+
+    async def finish_replacement(job):
+        completed = job.status == "completed"
+        await app.database["documents"].update_one(
+            {"_id": ObjectId(job.document_id)},
+            {"$set": {"status": "ready" if completed else "failed"}},
+        )
+
+        if app.answer_cache:
+            app.answer_cache.invalidate()
+
+        if (
+            completed
+            and previous_file_path
+            and previous_file_path != file_location
+            and os.path.exists(previous_file_path)
+        ):
+            os.remove(previous_file_path)
+
+    job = app.ingestion_jobs.submit(
+        document_id,
+        update.get("title", document["title"]),
+        partial(replace_pdf_in_qdrant, app.vector_store, file_location, document_id),
+        on_finish=finish_replacement,
+    )
+    print("Queued for Qdrant re-ingestion, job:", job.id)
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "success": True,
+        "message": "Document accepted for re-processing",
+        "data": {
+            "_id": document_id,
+            "title": update.get("title", document["title"]),
+            "status": update["status"],
+            "job_id": job.id,
+        },
+    }
+
+
 async def update_accessible_docs_for_all_users(app, document_id: str):
     # Find all users who have the document_id in accessible_docs or have an empty accessible_docs
     users = (
@@ -235,13 +517,21 @@ async def delete_document(document_id: str, request: Request, response: Response
             status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
         )
 
-    delete_document_from_qdrant(app.client, config("COLLECTION_NAME"), document_id)
+    # A running ingestion job would keep upserting chunks for the deleted
+    # document, leaving vectors no record points at.
+    if document.get("status") == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed",
+        )
+
+    vectors_deleted = await asyncio.to_thread(
+        delete_document_from_qdrant, app.client, config("COLLECTION_NAME"), document_id
+    )
 
     # Delete the file from disk
     file_path = document.get("file_path")
     if file_path:
-        import os
-
         if os.path.exists(file_path):
             os.remove(file_path)
 
@@ -249,6 +539,9 @@ async def delete_document(document_id: str, request: Request, response: Response
     result = await app.database["documents"].delete_one({"_id": ObjectId(document_id)})
 
     await update_accessible_docs_for_all_users(app, document_id)
+    app.user_profiles.invalidate_all()
+    if app.answer_cache:
+        app.answer_cache.invalidate()
 
     if not result:
         raise HTTPException(
@@ -263,6 +556,7 @@ async def delete_document(document_id: str, request: Request, response: Response
     return {
         "success": True,
         "message": "Document deleted successfully",
+        "data": {"vectors_deleted": vectors_deleted},
     }
 
 
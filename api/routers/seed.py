@@ -2,7 +2,7 @@ from fastapi import APIRouter, Header, Response, status, Request
 from models import User
 from typing import Annotated
 from auth import decode_jwt
-from utils import hash_password
+from utils import hash_password_async
 
 router = APIRouter(prefix="/seed", tags=["Seed"])
 
@@ -29,7 +29,7 @@ async def create_admin(
 
     # create new admin
     password = "admin"
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
 
     admin = User(
         name="Admin", email="admin@chatbot.com", password=hashed_password, role="admin"
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Response, status, Request
 from bson import ObjectId
 
+from db import delete_chat_messages
+
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
@@ -60,9 +62,16 @@ async def delete_user_and_all_their_chats(
         return {"success": False, "message": "User not found"}
 
     result = await app.database["users"].delete_one({"_id": ObjectId(user_id)})
+    app.user_profiles.invalidate(user["email"])
 
     # delete all the chats of the user
+    chats = (
+        await app.database["chats"]
+        .find({"user_email": user["email"]}, {"_id": 1})
+        .to_list(length=None)
+    )
     await app.database["chats"].delete_many({"user_email": user["email"]})
+    await delete_chat_messages(app.database, [chat["_id"] for chat in chats])
 
     if not result:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -161,6 +170,7 @@ async def remove_doc_access_for_user(
     result = await app.database["users"].update_one(
         {"_id": ObjectId(user_id)}, {"$set": user}
     )
+    app.user_profiles.invalidate(user["email"])
 
     if not result.acknowledged:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -207,6 +217,7 @@ async def add_doc_access_for_user(
     result = await app.database["users"].update_one(
         {"_id": ObjectId(user_id)}, {"$set": user}
     )
+    app.user_profiles.invalidate(user["email"])
 
     if not result.acknowledged:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -244,6 +255,7 @@ async def update_prompt(request: Request, response: Response, user_id: str):
     result = await app.database["users"].update_one(
         {"_id": ObjectId(user_id)}, {"$set": user}
     )
+    app.user_profiles.invalidate(user["email"])
     if not result.acknowledged:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"success": False, "message": "Could not update prompt"}
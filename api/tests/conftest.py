@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import math
+import os
+from typing import Optional
+
+# Settings are read at import time, so they have to be in place before any
+# application module is imported.
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("JWT_SECRET", "test-secret-that-is-long-enough-for-hs256")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("SALT", "$2b$04$abcdefghijklmnopqrstuu")
+os.environ.setdefault("VECTOR_DOC_DB_PATH", "vector_doc_db")
+os.environ.setdefault("COLLECTION_NAME", "test_collection")
+os.environ.setdefault("GENERATION_CANCEL_GRACE", "0.5")
+
+import httpx
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_qdrant import QdrantVectorStore
+from mongomock_motor import AsyncMongoMockClient
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+from auth import sign_jwt
+from db import UserProfileCache
+from main import app
+from model_inference import GenerationRegistry, LLMPool, LLMScheduler
+from model_inference.infer_model_chain import qa_chains
+from vectordb_handle import CachedQueryEmbeddings
+
+
+# Deterministic stand-in for all-MiniLM-L6-v2: same text, same 384-d vector.
+class FakeEmbeddings(Embeddings):
+    def embed(self, text: str) -> list[float]:
+        digest = hashlib.sha256(text.lower().encode("utf-8")).digest()
+        vector = [((digest[i % 32] + i) % 17) - 8 for i in range(384)]
+        norm = math.sqrt(sum(x * x for x in vector)) or 1
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed(text)
+
+
+# Streams `tokens` tokens and sleeps `delay` seconds before each one, like a
+# local model generating on a busy GPU. With `error` set every call raises it.
+class FakeStreamingLLM(BaseChatModel):
+    tokens: int = 10
+    delay: float = 0.05
+    model: str = "llama3.1"
+    base_url: str = "http://ollama"
+    error: Optional[Exception] = None
+    calls: int = 0
+    active: int = 0
+    max_active: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+
+        text = "".join(f"t{i} " for i in range(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            for i in range(self.tokens):
+                await asyncio.sleep(self.delay)
+                if self.error:
+                    raise self.error
+                yield ChatGenerationChunk(message=AIMessageChunk(content=f"t{i} "))
+        finally:
+            self.active -= 1
+
+
+def auth_header(email: str = "user@example.com", role: str = "user") -> dict:
+    token = sign_jwt({"name": email, "email": email, "role": role})["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def llm():
+    return FakeStreamingLLM()
+
+
+# The application state lifespan would create, backed by mongomock, an
+# in-memory Qdrant and the fake models instead of real services.
+@pytest.fixture
+def app_state(llm):
+    app.database = AsyncMongoMockClient().get_database("chatbot")
+    app.index_report = {"created": [], "existing": [], "failed": []}
+    app.user_profiles = UserProfileCache()
+
+    app.client = QdrantClient(":memory:")
+    app.client.create_collection(
+        collection_name=os.environ["COLLECTION_NAME"],
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+    )
+    app.embeddings = CachedQueryEmbeddings(FakeEmbeddings())
+    app.vector_store = QdrantVectorStore(
+        client=app.client,
+        collection_name=os.environ["COLLECTION_NAME"],
+        embedding=app.embeddings,
+    )
+
+    # Chains are cached per model endpoint and would keep an earlier test's LLM.
+    qa_chains.clear()
+    app.llm_pool = LLMPool(base_urls=[llm.base_url], default_model=llm.model)
+    app.llm_pool.backends[0].llms[llm.model] = llm
+    app.answer_cache = None
+    app.scheduler = LLMScheduler(max_concurrency=100, max_queue=100, max_per_user=100)
+    app.generations = GenerationRegistry()
+
+    # mongomock runs synchronously, any event loop will do.
+    asyncio.run(
+        app.database["users"].insert_one(
+            {
+                "name": "User",
+                "email": "user@example.com",
+                "password": "",
+                "role": "user",
+                "accessible_docs": ["all"],
+                "prompt": "You are helpful.",
+            }
+        )
+    )
+
+    yield app
+    app.client.close()
+
+
+@pytest.fixture
+async def client(app_state):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -0,0 +1,140 @@
+import pytest
+
+import model_inference.answer_cache as answer_cache
+from conftest import auth_header
+from main import app
+from model_inference import SemanticAnswerCache
+from test_documents import insert_document, jobs, upload, wait_for_job  # noqa: F401
+
+pytestmark = pytest.mark.anyio
+
+QUESTION = [1.0, 0.0, 0.0]
+SIMILAR = [0.99, 0.05, 0.0]
+OTHER = [0.0, 1.0, 0.0]
+
+
+def test_hit_only_within_partition():
+    cache = SemanticAnswerCache(threshold=0.95)
+    key = cache.partition_key(["doc-a"], "You are helpful.", "llama3.1")
+    cache.store(key, QUESTION, "answer", [])
+
+    assert cache.lookup(key, SIMILAR)["answer"] == "answer"
+    assert cache.lookup(key, OTHER) is None
+
+    other_docs = cache.partition_key(["doc-b"], "You are helpful.", "llama3.1")
+    other_prompt = cache.partition_key(["doc-a"], "You are a lawyer.", "llama3.1")
+    other_model = cache.partition_key(["doc-a"], "You are helpful.", "qwen2.5")
+    for other_key in (other_docs, other_prompt, other_model):
+        assert cache.lookup(other_key, QUESTION) is None
+
+    # Order of the accessible documents doesn't matter.
+    assert cache.partition_key(["b", "a"], "p", "m") == cache.partition_key(
+        ["a", "b"], "p", "m"
+    )
+
+
+def test_store_drops_answers_from_stale_corpus():
+    cache = SemanticAnswerCache()
+    key = cache.partition_key(["all"], "prompt", "llama3.1")
+
+    # Documents changed while the answer was being generated.
+    cache.invalidate()
+    cache.store(key, QUESTION, "stale answer", [])
+
+    assert cache.stats()["size"] == 0
+    new_key = cache.partition_key(["all"], "prompt", "llama3.1")
+    assert cache.lookup(new_key, QUESTION) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now)
+    cache = SemanticAnswerCache(ttl=60)
+    key = cache.partition_key(["all"], "prompt", "llama3.1")
+    cache.store(key, QUESTION, "answer", [])
+
+    now = 1059.0
+    assert cache.lookup(key, QUESTION)
+    now = 1061.0
+    assert cache.lookup(key, QUESTION) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = SemanticAnswerCache(max_size=2)
+    key = cache.partition_key(["all"], "prompt", "llama3.1")
+    cache.store(key, [1.0, 0.0, 0.0], "a", [])
+    cache.store(key, [0.0, 1.0, 0.0], "b", [])
+
+    assert cache.lookup(key, [1.0, 0.0, 0.0])["answer"] == "a"
+    cache.store(key, [0.0, 0.0, 1.0], "c", [])
+
+    assert cache.lookup(key, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(key, [1.0, 0.0, 0.0])["answer"] == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def fill(cache: SemanticAnswerCache):
+    key = cache.partition_key(["all"], "prompt", "llama3.1")
+    cache.store(key, QUESTION, "answer", [])
+    return cache.corpus_version
+
+
+async def test_invalidated_when_ingestion_finishes(client, jobs):  # noqa: F811
+    app.answer_cache = SemanticAnswerCache()
+    version = fill(app.answer_cache)
+
+    response = await upload(client)
+    await wait_for_job(jobs, response.json()["data"]["job_id"])
+
+    assert app.answer_cache.corpus_version > version
+    assert app.answer_cache.stats()["size"] == 0
+
+
+async def test_invalidated_when_document_deleted(client, jobs):  # noqa: F811
+    document_id = await insert_document("ready")
+    app.answer_cache = SemanticAnswerCache()
+    version = fill(app.answer_cache)
+
+    response = await client.delete(
+        f"/documents/{document_id}", headers=auth_header("admin@example.com", "admin")
+    )
+    assert response.status_code == 200
+    assert app.answer_cache.corpus_version > version
+    assert app.answer_cache.stats()["size"] == 0
+
+
+async def ask(client, email: str):
+    response = await client.post(
+        "/add-message",
+        json={"message": "What is the leave policy?", "user_email": email},
+        headers=auth_header(email),
+    )
+    chat_id = response.json()["chat_id"]
+    token = auth_header(email)["Authorization"].split()[1]
+    response = await client.get(
+        "/generate-response", params={"chat_id": chat_id, "token": token}
+    )
+    assert response.status_code == 200
+
+
+async def test_users_with_other_documents_miss(client, llm):
+    llm.tokens, llm.delay = 3, 0
+    app.answer_cache = SemanticAnswerCache()
+    await app.database["users"].insert_one(
+        {
+            "name": "Other",
+            "email": "other@example.com",
+            "password": "",
+            "role": "user",
+            "accessible_docs": ["64b000000000000000000001"],
+            "prompt": "You are helpful.",
+        }
+    )
+
+    await ask(client, "user@example.com")
+    await ask(client, "user@example.com")
+    assert llm.calls == 1
+
+    await ask(client, "other@example.com")
+    assert llm.calls == 2
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response, status
+
+from auth import JWTAuthMiddleware, decode_jwt
+from conftest import auth_header
+
+pytestmark = [pytest.mark.anyio, pytest.mark.benchmark]
+
+REQUESTS = 3000
+CONCURRENCY = 50
+
+
+async def private(request: Request):
+    return {"email": request.state.payload["email"]}
+
+
+# The http middleware main.py used before JWTAuthMiddleware: decodes the
+# token on every request and wraps every response.
+def before_app() -> FastAPI:
+    app = FastAPI()
+    app.get("/private")(private)
+
+    @app.middleware("http")
+    async def verify_token(request, call_next):
+        authorization = request.headers.get("Authorization")
+        if not authorization:
+            return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+
+        request.state.payload = decode_jwt(authorization.split(" ")[1])
+        return await call_next(request)
+
+    return app
+
+
+def after_app() -> FastAPI:
+    app = FastAPI()
+    app.get("/private")(private)
+    app.add_middleware(JWTAuthMiddleware, public_paths=set())
+    return app
+
+
+async def requests_per_second(app: FastAPI) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = auth_header()
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def worker(count: int):
+            for _ in range(count):
+                response = await client.get("/private", headers=headers)
+                assert response.status_code == 200
+
+        await worker(100)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(worker(REQUESTS // CONCURRENCY) for _ in range(CONCURRENCY))
+        )
+        return REQUESTS / (time.perf_counter() - started)
+
+
+async def test_authenticated_requests_per_second():
+    before = await requests_per_second(before_app())
+    after = await requests_per_second(after_app())
+
+    print(
+        f"\nAuthenticated GET, {CONCURRENCY} concurrent clients: "
+        f"{before:.0f} req/s before, {after:.0f} req/s after"
+    )
@@ -0,0 +1,100 @@
+import time
+
+import httpx
+import jwt
+import pytest
+from fastapi import FastAPI, Request
+
+import auth.middleware
+from auth import JWTAuthMiddleware
+from auth.middleware import VerifiedTokenCache
+from auth.auth_handler import JWT_ALGORITHM, JWT_SECRET
+from conftest import auth_header
+
+pytestmark = pytest.mark.anyio
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(JWTAuthMiddleware, public_paths={"/public"})
+
+    @app.get("/public")
+    async def public():
+        return {"success": True}
+
+    @app.get("/private")
+    async def private(request: Request):
+        return {"email": request.state.payload["email"]}
+
+    @app.options("/private")
+    async def private_options():
+        return {"success": True}
+
+    return app
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    decode_jwt = auth.middleware.decode_jwt
+
+    def counting_decode(token):
+        calls.append(token)
+        return decode_jwt(token)
+
+    monkeypatch.setattr(auth.middleware, "decode_jwt", counting_decode)
+    return calls
+
+
+async def test_public_paths_and_options_bypass(client):
+    assert (await client.get("/public")).status_code == 200
+    assert (await client.options("/private")).status_code == 200
+    assert (await client.get("/private")).status_code == 401
+
+
+@pytest.mark.parametrize(
+    "authorization",
+    ["Bearer", "Bearer undefined", "Token", "Bearer not.a.jwt", "Bearer " + "x" * 40],
+)
+async def test_bad_authorization_is_401(client, authorization):
+    response = await client.get("/private", headers={"Authorization": authorization})
+    assert response.status_code == 401
+
+
+async def test_valid_token_is_decoded_once(client, decodes):
+    for _ in range(3):
+        response = await client.get("/private", headers=auth_header())
+        assert response.status_code == 200
+        assert response.json() == {"email": "user@example.com"}
+
+    assert len(decodes) == 1
+
+
+def test_cached_token_expires_at_exp_claim(monkeypatch):
+    cache = VerifiedTokenCache(ttl=300)
+    now = time.time()
+    cache.add("token", {"email": "user@example.com", "exp": now + 60})
+
+    monkeypatch.setattr(auth.middleware.time, "time", lambda: now + 59)
+    assert cache.get("token") == {"email": "user@example.com", "exp": now + 60}
+
+    # Past exp but well within the cache TTL.
+    monkeypatch.setattr(auth.middleware.time, "time", lambda: now + 61)
+    assert cache.get("token") is None
+
+
+async def test_expired_token_is_401(client):
+    token = jwt.encode(
+        {"email": "user@example.com", "exp": int(time.time()) - 1},
+        JWT_SECRET,
+        algorithm=JWT_ALGORITHM,
+    )
+    response = await client.get("/private", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+import main
+from conftest import auth_header
+from main import app
+from model_inference import GenerationRegistry, estimate_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def registry(app_state):
+    app.generations = GenerationRegistry(cancel_grace=0.2)
+    return app.generations
+
+
+async def read_frames(generation, count: int):
+    follower = main.follow_generation(generation)
+    for _ in range(count):
+        await follower.__anext__()
+    return follower
+
+
+async def stored_answer(chat_id: str) -> str:
+    chat, messages = await main.get_recent_messages(app.database, chat_id, 10)
+    return messages[-1]["message"] if messages[-1]["sender"] == "ai" else None
+
+
+async def test_disconnect_cancels_after_grace(client, llm, registry):
+    llm.tokens, llm.delay = 40, 0.02
+    generation = await main.start_chat_turn("user@example.com", "question")
+
+    follower = await read_frames(generation, 4)
+    await follower.aclose()
+    await generation.task
+
+    assert generation.cancelled
+    assert llm.calls == 1
+    stats = registry.stats()
+    assert stats["cancelled"] == stats["cancelled_by_disconnect"] == 1
+
+    # The part the user saw is stored, and the LLM stopped well short.
+    partial = await stored_answer(generation.chat_id)
+    assert partial and len(partial.split()) < llm.tokens
+    assert stats["tokens_before_cancel"] == estimate_tokens(partial)
+    assert generation.events[-1][1]["cancelled"]
+
+
+async def test_tokens_saved_estimate(client, llm, registry):
+    llm.tokens, llm.delay = 20, 0
+    completed = await main.start_chat_turn("user@example.com", "question")
+    await completed.task
+    assert registry.stats()["completed"] == 1
+    average = registry.completed_tokens
+
+    llm.delay = 0.02
+    cancelled = await main.start_chat_turn("user@example.com", "question")
+    follower = await read_frames(cancelled, 3)
+    await follower.aclose()
+    await cancelled.task
+
+    stats = registry.stats()
+    assert stats["estimated_tokens_saved"] == average - stats["tokens_before_cancel"]
+    assert stats["estimated_tokens_saved"] > 0
+
+
+async def test_reconnect_rearms_full_grace_period(client, llm, registry):
+    llm.tokens, llm.delay = 40, 0.02
+    generation = await main.start_chat_turn("user@example.com", "question")
+
+    follower = await read_frames(generation, 2)
+    await follower.aclose()
+    await asyncio.sleep(0.15)
+
+    # Reconnect and drop again just before the first timer would fire.
+    follower = await read_frames(generation, 1)
+    await follower.aclose()
+    await asyncio.sleep(0.15)
+    assert not generation.cancelled
+
+    await generation.task
+    assert generation.cancelled
+
+
+async def test_cancel_endpoint(client, llm, registry):
+    llm.tokens, llm.delay = 40, 0.02
+    generation = await main.start_chat_turn("user@example.com", "question")
+    follower = await read_frames(generation, 2)
+    chat_id = generation.chat_id
+
+    response = await client.post(
+        "/generate-response/cancel",
+        json={"chat_id": chat_id},
+        headers=auth_header("other@example.com"),
+    )
+    assert response.status_code == 404
+
+    response = await client.post(
+        "/generate-response/cancel", json={"chat_id": chat_id}, headers=auth_header()
+    )
+    assert response.status_code == 200
+
+    await generation.task
+    await follower.aclose()
+    assert generation.cancelled
+    assert registry.stats()["cancelled_by_disconnect"] == 0
+
+    response = await client.post(
+        "/generate-response/cancel", json={"chat_id": chat_id}, headers=auth_header()
+    )
+    assert response.status_code == 409
+
+    response = await client.post(
+        "/generate-response/cancel",
+        json={"chat_id": "64b000000000000000000001"},
+        headers=auth_header(),
+    )
+    assert response.status_code == 404
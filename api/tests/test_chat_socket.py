@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+
+from fastapi.testclient import TestClient
+
+import main
+from conftest import auth_header
+
+
+@contextmanager
+def connect(app):
+    with TestClient(app).websocket_connect("/ws/chat") as socket:
+        token = auth_header()["Authorization"].split()[1]
+        socket.send_json({"type": "auth", "token": token})
+        assert socket.receive_json()["type"] == "ready"
+        yield socket
+
+
+def receive_until(socket, kind: str, stream_id: str) -> list[dict]:
+    messages = []
+    while True:
+        message = socket.receive_json()
+        if message.get("stream_id") == stream_id:
+            messages.append(message)
+            if message["type"] == kind:
+                return messages
+
+
+def test_bad_commands_keep_the_socket_open(app_state, llm):
+    llm.tokens, llm.delay = 3, 0.01
+
+    with connect(app_state) as socket:
+        bad_commands = [
+            {"type": "send", "message": "hi", "chat_id": "not-an-id"},
+            {"type": "send", "message": "hi", "chat_id": 42},
+            {"type": "send", "message": ["hi"]},
+            {"type": "send", "message": "hi", "model": {"name": "x"}},
+            {"type": "send", "message": "hi", "stream_id": ["s"]},
+            {"type": "resume", "chat_id": "not-an-id"},
+            {"type": "cancel", "chat_id": {"$ne": None}},
+            ["not", "a", "command"],
+        ]
+        for command in bad_commands:
+            socket.send_json(command)
+            error = socket.receive_json()
+            assert error["type"] == "error"
+            assert error["status"] == 400
+
+        socket.send_json({"type": "send", "message": "hi", "stream_id": "s1"})
+        messages = receive_until(socket, "done", "s1")
+        tokens = "".join(m.get("partial_response", "") for m in messages)
+        assert tokens == "t0 t1 t2 "
+        assert messages[-1]["success"]
+
+
+def test_failing_command_keeps_the_socket_open(app_state, llm, monkeypatch):
+    llm.tokens, llm.delay = 3, 0.01
+    start_chat_turn = main.start_chat_turn
+
+    async def broken_chat_turn(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    with connect(app_state) as socket:
+        monkeypatch.setattr(main, "start_chat_turn", broken_chat_turn)
+        socket.send_json({"type": "send", "message": "hi", "stream_id": "s1"})
+        error = socket.receive_json()
+        assert (error["type"], error["status"]) == ("error", 500)
+
+        monkeypatch.setattr(main, "start_chat_turn", start_chat_turn)
+        socket.send_json({"type": "send", "message": "hi", "stream_id": "s2"})
+        assert receive_until(socket, "done", "s2")[-1]["success"]
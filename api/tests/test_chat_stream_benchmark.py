@@ -0,0 +1,95 @@
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockCollection
+
+from conftest import auth_header
+
+pytestmark = [pytest.mark.anyio, pytest.mark.benchmark]
+
+NETWORK_RTT = 0.02
+DB_LATENCY = 0.002
+TURNS = 8
+
+
+# Every request pays a client round trip and every database call a
+# database round trip, the costs /chat-stream saves on.
+class SlowTransport(httpx.ASGITransport):
+    async def handle_async_request(self, request):
+        await asyncio.sleep(NETWORK_RTT)
+        return await super().handle_async_request(request)
+
+
+@pytest.fixture
+def db_operations(monkeypatch):
+    counter = {"operations": 0}
+    for name in ("find_one", "find_one_and_update", "update_one", "insert_one"):
+        method = getattr(AsyncMongoMockCollection, name)
+
+        def slow(method):
+            async def call(self, *args, **kwargs):
+                counter["operations"] += 1
+                await asyncio.sleep(DB_LATENCY)
+                return await method(self, *args, **kwargs)
+
+            return call
+
+        monkeypatch.setattr(AsyncMongoMockCollection, name, slow(method))
+    return counter
+
+
+# /add-message followed by GET /generate-response, as the frontend did.
+async def two_requests(client, chat_id):
+    body = {"message": "What is the leave policy?", "user_email": "user@example.com"}
+    if chat_id:
+        body["chat_id"] = chat_id
+    response = await client.post("/add-message", json=body, headers=auth_header())
+    chat_id = response.json()["chat_id"]
+
+    token = auth_header()["Authorization"].split()[1]
+    response = await client.get(
+        "/generate-response", params={"chat_id": chat_id, "token": token}
+    )
+    assert "done" in response.text
+    return chat_id
+
+
+async def one_request(client, chat_id):
+    body = {"message": "What is the leave policy?"}
+    if chat_id:
+        body["chat_id"] = chat_id
+    response = await client.post("/chat-stream", json=body, headers=auth_header())
+    assert "done" in response.text
+
+    for line in response.text.splitlines():
+        if line.startswith("data: ") and '"title"' in line:
+            return json.loads(line[len("data: ") :])["chat_id"]
+    return chat_id
+
+
+async def test_chat_turn_latency(app_state, llm, db_operations):
+    llm.tokens, llm.delay = 5, 0.01
+    transport = SlowTransport(app=app_state)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for turn in (two_requests, one_request):
+            chat_id = None
+            latencies, operations = [], []
+            for _ in range(TURNS):
+                before = db_operations["operations"]
+                started = time.perf_counter()
+                chat_id = await turn(client, chat_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+                operations.append(db_operations["operations"] - before)
+                # Let the background summary settle outside the timing.
+                await asyncio.sleep(0.05)
+
+            median = statistics.median(latencies[1:])
+            print(
+                f"\n{turn.__name__}: median turn {median:.1f} ms, "
+                f"database calls per turn {operations}"
+            )
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import auth_header
+from main import app
+from test_concurrency import start_chat
+
+pytestmark = pytest.mark.anyio
+
+
+async def chat_turn(client, chat_id: str, message: str):
+    return await client.post(
+        "/chat-stream",
+        json={"message": message, "chat_id": chat_id},
+        headers=auth_header(),
+    )
+
+
+async def test_concurrent_turns_on_one_chat_conflict(client, llm):
+    llm.tokens, llm.delay = 5, 0.02
+    chat_id = await start_chat(client)
+    token = auth_header()["Authorization"].split()[1]
+    first = await client.get(
+        "/generate-response", params={"chat_id": chat_id, "token": token}
+    )
+    assert first.status_code == 200
+
+    responses = await asyncio.gather(
+        chat_turn(client, chat_id, "first"), chat_turn(client, chat_id, "second")
+    )
+    assert sorted(r.status_code for r in responses) == [200, 409]
+
+    chat = await app.database["chats"].find_one({})
+    assert [m["sender"] for m in chat["messages"]] == ["human", "ai", "human", "ai"]
+
+    # Once the reply is stored the chat takes the next turn.
+    response = await chat_turn(client, chat_id, "third")
+    assert response.status_code == 200
+
+
+async def test_generate_response_only_for_own_chats(client, llm):
+    llm.tokens, llm.delay = 3, 0.01
+    chat_id = await start_chat(client)
+    other = auth_header("other@example.com")["Authorization"].split()[1]
+
+    response = await client.get(
+        "/generate-response", params={"chat_id": chat_id, "token": other}
+    )
+    assert response.status_code == 404
+    assert app.generations.get(chat_id) is None
+    assert app.scheduler.stats()["preparing"] == 0
+
+
+def parse_events(body: str) -> list[dict]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        event = {"event": None}
+        for line in frame.splitlines():
+            field, _, value = line.partition(": ")
+            event[field] = json.loads(value) if field == "data" else value
+        events.append(event)
+    return events
+
+
+def answer_of(events: list[dict]) -> str:
+    return "".join(e["data"]["partial_response"] for e in events if e["event"] is None)
+
+
+async def generate(client, chat_id: str, last_event_id: str = None):
+    token = auth_header()["Authorization"].split()[1]
+    headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+    return await client.get(
+        "/generate-response",
+        params={"chat_id": chat_id, "token": token},
+        headers=headers,
+    )
+
+
+async def test_answer_is_stored_by_the_server(client, llm):
+    llm.tokens, llm.delay = 3, 0
+    chat_id = await start_chat(client)
+
+    events = parse_events((await generate(client, chat_id)).text)
+
+    assert events[-1]["event"] == "done"
+    chat = await app.database["chats"].find_one({})
+    assert chat["messages"][-1] == {"sender": "ai", "message": "t0 t1 t2"}
+    assert chat["message_count"] == 2
+
+
+async def test_resume_after_last_event_id(client, llm):
+    llm.tokens, llm.delay = 6, 0
+    chat_id = await start_chat(client)
+    events = parse_events((await generate(client, chat_id)).text)
+
+    # The client saw everything up to the third event before reconnecting.
+    response = await generate(client, chat_id, events[2]["id"])
+    resumed = parse_events(response.text)
+
+    assert response.status_code == 200
+    assert [e["id"] for e in resumed] == [e["id"] for e in events[3:]]
+    assert app.generations.stats()["resumed"] == 1
+    assert llm.calls == 1
+
+
+async def test_second_request_follows_running_generation(client, llm):
+    llm.tokens, llm.delay = 5, 0.02
+    chat_id = await start_chat(client)
+
+    first, second = await asyncio.gather(
+        generate(client, chat_id), generate(client, chat_id)
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert answer_of(parse_events(first.text)) == "t0 t1 t2 t3 t4 "
+    assert answer_of(parse_events(second.text)) == "t0 t1 t2 t3 t4 "
+    assert llm.calls == 1
+
+
+async def test_reconnect_after_buffer_expired(client, llm):
+    llm.tokens, llm.delay = 3, 0
+    chat_id = await start_chat(client)
+    events = parse_events((await generate(client, chat_id)).text)
+
+    app.generations.ttl = 0
+    response = await generate(client, chat_id, events[1]["id"])
+
+    assert response.status_code == 204
+    assert llm.calls == 1
+
+
+async def test_malformed_chat_id_is_rejected(client, llm):
+    response = await chat_turn(client, "not-an-id", "hello")
+    assert response.status_code == 400
+
+    token = auth_header()["Authorization"].split()[1]
+    response = await client.get(
+        "/generate-response", params={"chat_id": "not-an-id", "token": token}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from model_inference import coalesce_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+def token(text: str):
+    return None, {"chat_id": "c", "partial_response": text}
+
+
+async def timed_stream(items):
+    for delay, item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(events, **kwargs) -> list[tuple[float, tuple]]:
+    started = time.perf_counter()
+    return [
+        (time.perf_counter() - started, event)
+        async for event in coalesce_tokens(events, **kwargs)
+    ]
+
+
+async def test_first_token_passes_through_immediately():
+    gate = asyncio.Event()
+
+    async def stream():
+        yield token("first")
+        await gate.wait()
+        yield token("second")
+
+    events = coalesce_tokens(stream(), window_ms=1000, max_bytes=1000)
+    assert await asyncio.wait_for(events.__anext__(), 0.5) == token("first")
+    gate.set()
+    assert await events.__anext__() == token("second")
+
+
+async def test_tokens_within_window_are_merged():
+    items = [(0, token("a"))] + [(0.001, token(t)) for t in "bcd"]
+    items += [(0.1, token("e"))]
+
+    result = await collect(timed_stream(items), window_ms=30, max_bytes=1000)
+
+    assert [event for _, event in result] == [token("a"), token("bcd"), token("e")]
+    # "bcd" went out when the window closed, not when "e" arrived.
+    assert result[1][0] < 0.09
+
+
+async def test_flushes_once_max_bytes_pile_up():
+    items = [(0, token(t)) for t in ["first", "12", "34", "56", "78"]]
+
+    result = await collect(timed_stream(items), window_ms=10_000, max_bytes=4)
+
+    assert [e for _, e in result] == [token("first"), token("1234"), token("5678")]
+    assert result[-1][0] < 1
+
+
+async def test_named_events_flush_pending_text():
+    items = [(0, token("a")), (0, token("b")), (0, token("c"))]
+    items += [(0, ("done", {"success": True}))]
+
+    result = await collect(timed_stream(items), window_ms=10_000, max_bytes=1000)
+
+    assert [e for _, e in result] == [
+        token("a"),
+        token("bc"),
+        ("done", {"success": True}),
+    ]
+
+
+async def test_pump_errors_propagate():
+    async def failing():
+        yield token("a")
+        yield token("b")
+        raise RuntimeError("ollama went away")
+
+    events = coalesce_tokens(failing(), window_ms=10_000, max_bytes=1000)
+    assert await events.__anext__() == token("a")
+    with pytest.raises(RuntimeError, match="ollama went away"):
+        await events.__anext__()
+
+
+@pytest.mark.parametrize("window_ms", [5, 0])
+async def test_closing_stops_the_upstream_generator(window_ms):
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield token("t")
+        finally:
+            closed.set()
+
+    events = coalesce_tokens(endless(), window_ms=window_ms, max_bytes=1000)
+    await events.__anext__()
+    await events.__anext__()
+    await events.aclose()
+
+    assert closed.is_set()
+
+
+async def test_disabled_passes_events_through():
+    items = [(0, token(t)) for t in "abc"]
+
+    result = await collect(timed_stream(items), window_ms=0)
+
+    assert [e for _, e in result] == [token("a"), token("b"), token("c")]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from conftest import auth_header
+
+pytestmark = pytest.mark.anyio
+
+GENERATIONS = 10
+
+
+async def start_chat(client, message: str = "What is the leave policy?") -> str:
+    response = await client.post(
+        "/add-message",
+        json={"message": message, "user_email": "user@example.com"},
+        headers=auth_header(),
+    )
+    assert response.status_code == 201
+    return response.json()["chat_id"]
+
+
+async def stream_answer(client, chat_id: str) -> str:
+    token = auth_header()["Authorization"].split()[1]
+    response = await client.get(
+        "/generate-response", params={"chat_id": chat_id, "token": token}
+    )
+    assert response.status_code == 200
+
+    answer = ""
+    for line in response.text.splitlines():
+        if line.startswith("data: "):
+            data = json.loads(line[len("data: ") :])
+            answer += data.get("partial_response", "")
+    return answer
+
+
+async def test_generations_stream_concurrently(client, llm):
+    llm.tokens, llm.delay = 10, 0.05
+    chat_ids = [await start_chat(client) for _ in range(GENERATIONS)]
+
+    started = time.perf_counter()
+    answers = await asyncio.gather(*(stream_answer(client, c) for c in chat_ids))
+    elapsed = time.perf_counter() - started
+
+    expected = "".join(f"t{i} " for i in range(llm.tokens))
+    assert answers == [expected] * GENERATIONS
+    # One answer takes 0.5 s; run one after another they would take 5 s.
+    assert elapsed < 2
+
+
+async def test_health_stays_responsive_while_generating(client, llm):
+    llm.tokens, llm.delay = 20, 0.05
+    chat_ids = [await start_chat(client) for _ in range(GENERATIONS)]
+    streams = [asyncio.create_task(stream_answer(client, c)) for c in chat_ids]
+
+    await asyncio.sleep(0.1)
+    latencies = []
+    while not all(stream.done() for stream in streams):
+        started = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+        await asyncio.sleep(0.05)
+
+    await asyncio.gather(*streams)
+    assert len(latencies) > 5
+    assert max(latencies) < 0.2
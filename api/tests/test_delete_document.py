@@ -0,0 +1,54 @@
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from vectordb_handle import delete_document_from_qdrant
+
+COLLECTION = "delete_test"
+BATCH = 1000
+
+
+def add_points(client: QdrantClient, document_id: str, count: int, start: int):
+    for offset in range(0, count, BATCH):
+        client.upsert(
+            collection_name=COLLECTION,
+            points=[
+                rest.PointStruct(
+                    id=start + offset + i,
+                    vector=[1.0, 0.0, 0.0, 0.0],
+                    payload={"metadata": {"document_id": document_id}},
+                )
+                for i in range(min(BATCH, count - offset))
+            ],
+        )
+
+
+# The previous implementation scrolled a single page of 10k ids, larger
+# documents were left half deleted.
+def test_delete_document_with_more_than_10k_chunks():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=rest.VectorParams(size=4, distance=rest.Distance.COSINE),
+    )
+    add_points(client, "large", 10_500, start=0)
+    add_points(client, "other", 20, start=10_500)
+
+    assert delete_document_from_qdrant(client, COLLECTION, "large") == 10_500
+
+    def remaining(document_id: str) -> int:
+        return client.count(
+            collection_name=COLLECTION,
+            count_filter=rest.Filter(
+                must=[
+                    rest.FieldCondition(
+                        key="metadata.document_id",
+                        match=rest.MatchValue(value=document_id),
+                    )
+                ]
+            ),
+            exact=True,
+        ).count
+
+    assert remaining("large") == 0
+    assert remaining("other") == 20
+    assert delete_document_from_qdrant(client, COLLECTION, "large") == 0
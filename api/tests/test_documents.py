@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+from datetime import datetime
+
+import pytest
+
+import routers.documents
+from db import fail_interrupted_documents
+from conftest import auth_header
+from main import app
+from vectordb_handle import IngestionJobQueue
+
+pytestmark = pytest.mark.anyio
+
+PDF = b"%PDF-1.4 test document"
+
+
+@pytest.fixture
+async def jobs(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(routers.documents, "upsert_pdf_to_qdrant", fake_ingest)
+    monkeypatch.setattr(routers.documents, "replace_pdf_in_qdrant", fake_ingest)
+
+    app.ingestion_jobs = IngestionJobQueue()
+    app.ingestion_jobs.start()
+    yield app.ingestion_jobs
+    await app.ingestion_jobs.stop()
+
+
+def fake_ingest(vector_store, pdf_path, document_id, report_progress=None):
+    return 1
+
+
+async def wait_for_job(jobs, job_id: str):
+    while jobs.get(job_id).status in ("queued", "running"):
+        await asyncio.sleep(0.01)
+
+
+async def insert_document(status: str) -> str:
+    result = await app.database["documents"].insert_one(
+        {
+            "title": "Handbook",
+            "file_path": "uploaded_documents/old.pdf",
+            "content_hash": hashlib.sha256(PDF).hexdigest(),
+            "status": status,
+            "created_at": datetime.now(),
+        }
+    )
+    return str(result.inserted_id)
+
+
+async def upload(client, method: str = "POST", path: str = "/documents/"):
+    return await client.request(
+        method,
+        path,
+        data={"title": "Handbook v2"},
+        files={"file": ("handbook.pdf", PDF, "application/pdf")},
+        headers=auth_header("admin@example.com", "admin"),
+    )
+
+
+async def test_failed_duplicate_is_retried(client, jobs):
+    document_id = await insert_document("failed")
+
+    response = await upload(client)
+    assert response.status_code == 202
+    data = response.json()["data"]
+    assert data["_id"] == document_id
+
+    await wait_for_job(jobs, data["job_id"])
+    document = await app.database["documents"].find_one({})
+    assert document["status"] == "ready"
+    assert document["title"] == "Handbook v2"
+    assert await app.database["documents"].count_documents({}) == 1
+
+
+async def test_ready_duplicate_is_reused(client, jobs):
+    document_id = await insert_document("ready")
+
+    response = await upload(client)
+    assert response.status_code == 200
+    assert response.json()["data"]["duplicate"] is True
+    assert response.json()["data"]["_id"] == document_id
+
+
+async def test_replace_while_processing_conflicts(client, jobs):
+    document_id = await insert_document("processing")
+
+    response = await upload(client, "PUT", f"/documents/{document_id}")
+    assert response.status_code == 409
+
+
+async def test_replace_ready_document(client, jobs):
+    document_id = await insert_document("ready")
+    await app.database["documents"].update_one({}, {"$set": {"content_hash": "old"}})
+
+    response = await upload(client, "PUT", f"/documents/{document_id}")
+    assert response.status_code == 202
+
+    await wait_for_job(jobs, response.json()["data"]["job_id"])
+    document = await app.database["documents"].find_one({})
+    assert document["status"] == "ready"
+
+
+async def test_delete_while_processing_conflicts(client, jobs):
+    document_id = await insert_document("processing")
+
+    response = await client.delete(
+        f"/documents/{document_id}", headers=auth_header("admin@example.com", "admin")
+    )
+    assert response.status_code == 409
+    assert await app.database["documents"].count_documents({}) == 1
+
+
+async def test_delete_ready_document(client, jobs):
+    document_id = await insert_document("ready")
+
+    response = await client.delete(
+        f"/documents/{document_id}", headers=auth_header("admin@example.com", "admin")
+    )
+    assert response.status_code == 200
+    assert await app.database["documents"].count_documents({}) == 0
+
+
+async def test_interrupted_ingestion_can_be_retried(client, jobs):
+    document_id = await insert_document("processing")
+
+    assert await fail_interrupted_documents(app.database) == 1
+
+    response = await upload(client)
+    assert response.status_code == 202
+    assert response.json()["data"]["_id"] == document_id
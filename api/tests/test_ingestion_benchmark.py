@@ -0,0 +1,122 @@
+import os
+import time
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+from vectordb_handle.upsert_to_qdrant import (
+    EMBEDDING_BATCH_SIZE,
+    embed_and_upsert,
+    load_pdf_chunks,
+)
+
+pytestmark = pytest.mark.benchmark
+
+SAMPLE_PAGES = 60
+SAMPLE_TEXT = (
+    "Employees accrue annual leave monthly and may carry over up to five "
+    "days into the next year. Requests go to the line manager at least two "
+    "weeks ahead. Sick leave requires a certificate after three days. "
+)
+
+
+# A text PDF with SAMPLE_PAGES pages of prose, used unless BENCHMARK_PDF
+# points at a real document.
+def write_sample_pdf(path: str):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None]
+    font = 3
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages = []
+    for page in range(SAMPLE_PAGES):
+        lines = [f"Section {page + 1}. " + SAMPLE_TEXT * 2] * 40
+        stream = "BT /F1 9 Tf 36 800 Td 11 TL " + " ".join(
+            f"({line[:110]}) '" for line in lines
+        ) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> "
+            f"/Contents {len(objects)} 0 R >>"
+        )
+        pages.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in pages)}] "
+        f"/Count {len(pages)} >>"
+    )
+
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{content}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    body += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+
+    with open(path, "wb") as pdf:
+        pdf.write(body)
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    pytest.importorskip("sentence_transformers")
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    try:
+        return HuggingFaceEmbeddings(
+            model_name="all-MiniLM-L6-v2",
+            encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+        )
+    except Exception as e:
+        pytest.skip(f"Embedding model is not available: {e!r}")
+
+
+@pytest.fixture(scope="module")
+def sample_pdf(tmp_path_factory):
+    path = os.environ.get("BENCHMARK_PDF")
+    if not path:
+        path = str(tmp_path_factory.mktemp("pdf") / "sample.pdf")
+        write_sample_pdf(path)
+    return path
+
+
+def vector_store(embeddings):
+    from langchain_qdrant import QdrantVectorStore
+
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name="benchmark",
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+    )
+    return QdrantVectorStore(
+        client=client, collection_name="benchmark", embedding=embeddings
+    )
+
+
+# Chunks per second of the previous ingestion loop, add_documents four chunks
+# at a time, against embed_and_upsert's large batches with pipelined writes.
+def test_ingestion_throughput(embeddings, sample_pdf):
+    texts, ids = load_pdf_chunks(sample_pdf, "benchmark")
+    assert texts
+
+    store = vector_store(embeddings)
+    started = time.perf_counter()
+    for i in range(0, len(texts), 4):
+        store.add_documents(texts[i : i + 4], ids=ids[i : i + 4])
+    before = len(texts) / (time.perf_counter() - started)
+
+    store = vector_store(embeddings)
+    started = time.perf_counter()
+    embed_and_upsert(store, texts, ids)
+    after = len(texts) / (time.perf_counter() - started)
+    assert store.client.count("benchmark").count == len(texts)
+
+    print(
+        f"\n{len(texts)} chunks of {sample_pdf}: "
+        f"{before:.0f} chunks/s before, {after:.0f} chunks/s after"
+    )
@@ -0,0 +1,70 @@
+import httpx
+import pytest
+from ollama import ResponseError
+
+from conftest import auth_header
+from main import app
+from model_inference import LLMPool, UnknownModel
+
+pytestmark = pytest.mark.anyio
+
+
+def make_pool() -> LLMPool:
+    pool = LLMPool(base_urls=["http://a", "http://b"], models=[])
+    pool.backends[0].models = {"llama3.1:latest"}
+    pool.backends[1].models = {"mistral:7b"}
+    return pool
+
+
+def test_resolve_model_checks_reported_models():
+    pool = make_pool()
+
+    assert pool.resolve_model(None) == "llama3.1"
+    assert pool.resolve_model("mistral:7b") == "mistral:7b"
+    with pytest.raises(UnknownModel):
+        pool.resolve_model("not-a-model")
+
+
+def test_resolve_model_before_health_check():
+    pool = LLMPool(base_urls=["http://a"], models=[])
+
+    assert pool.resolve_model("anything") == "anything"
+
+
+def test_request_errors_keep_backend_healthy():
+    pool = make_pool()
+
+    with pytest.raises(ResponseError):
+        with pool.lease("llama3.1"):
+            raise ResponseError("model requires more system memory")
+
+    assert pool.backends[0].healthy
+    assert pool.backends[0].outstanding == 0
+
+
+@pytest.mark.parametrize(
+    "error", [httpx.ConnectError("refused"), httpx.ReadTimeout("timed out")]
+)
+def test_connection_errors_eject_backend(error):
+    pool = make_pool()
+
+    with pytest.raises(type(error)):
+        with pool.lease("llama3.1"):
+            raise error
+
+    assert not pool.backends[0].healthy
+    assert pool.backends[0].failures == 1
+
+
+async def test_change_model_rejects_unknown_model(client, llm):
+    app.llm_pool.backends[0].models = {"llama3.1:latest"}
+
+    response = await client.post(
+        "/change-model", json={"model": "not-a-model"}, headers=auth_header()
+    )
+    assert response.status_code == 400
+
+    response = await client.post(
+        "/change-model", json={"model": "llama3.1"}, headers=auth_header()
+    )
+    assert response.status_code == 200
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import bcrypt
+import pytest
+
+from main import app
+from test_concurrency import start_chat, stream_answer
+from utils.encrypt_password import hash_password, verify_password
+
+pytestmark = pytest.mark.anyio
+
+LOGINS = 20
+STREAMS = 5
+
+
+async def test_verify_password_accepts_stored_hashes():
+    # Hashes stored by hash_password, with the salt from SALT, keep working.
+    stored = hash_password("secret")
+
+    assert await verify_password("secret", stored)
+    assert not await verify_password("wrong", stored)
+    assert not await verify_password("secret", "not a bcrypt hash")
+
+
+async def login(client) -> float:
+    started = time.perf_counter()
+    response = await client.post(
+        "/auth/login", json={"email": "storm@example.com", "password": "secret"}
+    )
+    assert response.status_code == 200
+    return time.perf_counter() - started
+
+
+async def timed_stream(client, chat_id: str) -> float:
+    started = time.perf_counter()
+    assert await stream_answer(client, chat_id)
+    return time.perf_counter() - started
+
+
+async def test_streams_keep_pace_during_login_storm(client, llm):
+    llm.tokens, llm.delay = 20, 0.02
+    await app.database["users"].insert_one(
+        {
+            "name": "Storm",
+            "email": "storm@example.com",
+            "password": bcrypt.hashpw(b"secret", bcrypt.gensalt(10)).decode(),
+            "role": "user",
+        }
+    )
+    chat_ids = [await start_chat(client) for _ in range(STREAMS)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(timed_stream(client, chat_id) for chat_id in chat_ids),
+        *(login(client) for _ in range(LOGINS)),
+    )
+    storm = time.perf_counter() - started
+    streams = results[:STREAMS]
+
+    # An answer takes 0.4 s of token delays. With bcrypt on the event loop
+    # the logins (about 0.1 s each at cost 10) would stall every open stream
+    # for around 2 s; off the loop they only compete for CPU.
+    assert max(streams) < 1.2
+    assert storm > max(streams)
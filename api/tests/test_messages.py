@@ -0,0 +1,100 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import db.messages
+from db import append_and_get_recent, get_recent_messages
+from db.migrations import backfill_chat_external_count
+from models import Chat
+
+pytestmark = pytest.mark.anyio
+
+
+# Counts queries against the messages collection.
+class CountingDatabase:
+    def __init__(self, database):
+        self.database = database
+        self.message_finds = 0
+
+    def __getitem__(self, name):
+        collection = self.database[name]
+        if name != "messages":
+            return collection
+
+        counter = self
+
+        class Messages:
+            def __getattr__(self, attr):
+                return getattr(collection, attr)
+
+            def find(self, *args, **kwargs):
+                counter.message_finds += 1
+                return collection.find(*args, **kwargs)
+
+        return Messages()
+
+
+async def create_chat(database, messages: int) -> str:
+    chat = Chat(
+        title="chat",
+        user_email="user@example.com",
+        messages=[{"sender": "human", "message": f"m{i}"} for i in range(messages)],
+        message_count=messages,
+    )
+    result = await database["chats"].insert_one(chat.model_dump())
+    return str(result.inserted_id)
+
+
+@pytest.fixture
+def database():
+    return CountingDatabase(AsyncMongoMockClient().get_database("chatbot"))
+
+
+async def test_long_embedded_chat_needs_no_extra_query(database):
+    chat_id = await create_chat(database, 30)
+
+    chat, messages = await get_recent_messages(database, chat_id, 10)
+    assert chat["user_email"] == "user@example.com"
+    assert [m["message"] for m in messages] == [f"m{i}" for i in range(20, 30)]
+
+    chat, messages = await append_and_get_recent(
+        database, chat_id, "user@example.com", "human", "new", 10
+    )
+    assert chat["message_count"] == 31
+    assert [m["message"] for m in messages][-2:] == ["m29", "new"]
+    assert database.message_finds == 0
+
+
+async def test_recent_messages_filter_by_owner(database):
+    chat_id = await create_chat(database, 2)
+
+    chat, messages = await get_recent_messages(
+        database, chat_id, 10, "other@example.com"
+    )
+    assert chat is None and messages == []
+
+
+async def test_separate_collection_tops_up_window(database, monkeypatch):
+    monkeypatch.setattr(db.messages, "SEPARATE_MESSAGES_COLLECTION", True)
+    chat_id = await create_chat(database, 3)
+
+    for i in range(3, 6):
+        await append_and_get_recent(
+            database, chat_id, "user@example.com", "human", f"m{i}", 4
+        )
+
+    chat, messages = await get_recent_messages(database, chat_id, 4)
+    assert chat["external_count"] == 3
+    assert [m["message"] for m in messages] == ["m2", "m3", "m4", "m5"]
+
+
+async def test_backfill_external_count(database):
+    chat_id = await create_chat(database, 2)
+    await database["chats"].update_one(
+        {}, {"$set": {"message_count": 5}, "$unset": {"external_count": ""}}
+    )
+
+    await backfill_chat_external_count(database.database)
+
+    chat = await database["chats"].find_one({})
+    assert str(chat["_id"]) == chat_id
+    assert chat["external_count"] == 3
@@ -0,0 +1,64 @@
+from langchain_core.documents import Document
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+import vectordb_handle.upsert_to_qdrant as upsert_to_qdrant
+from conftest import FakeEmbeddings
+from vectordb_handle import replace_pdf_in_qdrant, upsert_pdf_to_qdrant
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+# Stands in for PyPDFLoader, one Document per page like the real loader.
+def revision(pages: list[str]):
+    class Loader:
+        def __init__(self, pdf_path):
+            self.pdf_path = pdf_path
+
+        def load(self):
+            return [
+                Document(
+                    page_content=text,
+                    metadata={"page": page, "source": self.pdf_path},
+                )
+                for page, text in enumerate(pages)
+            ]
+
+    return Loader
+
+
+def test_reused_chunks_get_new_page_and_source(monkeypatch):
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name="replace",
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+    )
+    embeddings = CountingEmbeddings()
+    store = QdrantVectorStore(
+        client=client, collection_name="replace", embedding=embeddings
+    )
+
+    monkeypatch.setattr(upsert_to_qdrant, "PyPDFLoader", revision(["intro", "policy"]))
+    upsert_pdf_to_qdrant(store, "v1.pdf", "doc")
+
+    # A new page in front moves the policy chunk from page 1 to page 2.
+    monkeypatch.setattr(
+        upsert_to_qdrant, "PyPDFLoader", revision(["intro", "new section", "policy"])
+    )
+    embeddings.embedded = 0
+    assert replace_pdf_in_qdrant(store, "v2.pdf", "doc") == 1
+    assert embeddings.embedded == 1
+
+    points, _ = client.scroll("replace", limit=10, with_payload=True)
+    metadata = {p.payload["page_content"]: p.payload["metadata"] for p in points}
+    assert metadata["policy"]["page"] == 2
+    assert metadata["intro"]["page"] == 0
+    assert all(m["source"] == "v2.pdf" for m in metadata.values())
+    assert all(m["document_id"] == "doc" for m in metadata.values())
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from main import app, summarize_chat
+from model_inference import LLMScheduler, SchedulerFull
+from model_inference.scheduler import Ticket
+from test_concurrency import start_chat, stream_answer
+from test_summary import create_long_chat
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for_slot(scheduler: LLMScheduler, ticket: Ticket) -> list[int]:
+    return [position async for position in scheduler.wait(ticket)]
+
+
+async def test_admitting_does_not_take_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=4, max_per_user=4)
+    preparing = scheduler.admit("a")
+    waiting = scheduler.admit("b")
+
+    # The first ticket is still retrieving (or hit the cache), it doesn't
+    # keep the second one from the model.
+    assert await wait_for_slot(scheduler, waiting) == []
+    assert waiting.granted and not preparing.granted
+
+    scheduler.release(preparing)
+    scheduler.release(waiting)
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.stats()["preparing"] == 0
+
+
+async def test_users_are_served_round_robin():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=8, max_per_user=4)
+    first = scheduler.admit("a")
+    await wait_for_slot(scheduler, first)
+
+    tickets = [scheduler.admit(user) for user in ("a", "a", "a", "b", "c")]
+    waits = [asyncio.create_task(wait_for_slot(scheduler, t)) for t in tickets]
+    await asyncio.sleep(0)
+    assert [scheduler.position(t) for t in tickets] == [1, 4, 5, 2, 3]
+
+    order = []
+    running = first
+    for _ in tickets:
+        scheduler.release(running)
+        await asyncio.sleep(0)
+        running = next(t for t in tickets if t.granted and not t.released)
+        order.append(tickets.index(running))
+
+    assert order == [0, 3, 4, 1, 2]
+    await asyncio.gather(*waits)
+
+
+async def test_limits():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1, max_per_user=1)
+    scheduler.admit("a")
+
+    with pytest.raises(SchedulerFull) as per_user:
+        scheduler.admit("a")
+    assert per_user.value.status_code == 429
+
+    scheduler.admit("b")
+    with pytest.raises(SchedulerFull) as queue_full:
+        scheduler.admit("c")
+    assert queue_full.value.status_code == 503
+
+
+async def test_background_waits_for_users():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=4, max_per_user=4)
+    running = scheduler.admit("a")
+    await wait_for_slot(scheduler, running)
+
+    summary = scheduler.admit("summaries", background=True)
+    user = scheduler.admit("b")
+    summary_wait = asyncio.create_task(wait_for_slot(scheduler, summary))
+    await asyncio.sleep(0)
+    user_wait = asyncio.create_task(wait_for_slot(scheduler, user))
+    await asyncio.sleep(0)
+    assert scheduler.position(summary) == 2
+
+    scheduler.release(running)
+    await user_wait
+    assert not summary.granted
+
+    scheduler.release(user)
+    await summary_wait
+    assert summary.granted
+
+
+async def test_generations_respect_concurrency(client, llm):
+    llm.tokens, llm.delay = 5, 0.02
+    app.scheduler = LLMScheduler(max_concurrency=2, max_queue=8, max_per_user=8)
+    chat_ids = [await start_chat(client) for _ in range(6)]
+
+    answers = await asyncio.gather(*(stream_answer(client, c) for c in chat_ids))
+
+    assert all(answer == "t0 t1 t2 t3 t4 " for answer in answers)
+    assert llm.max_active == 2
+    assert app.scheduler.stats()["running"] == 0
+
+
+async def test_summary_goes_through_scheduler(client, llm):
+    llm.tokens, llm.delay = 3, 0.01
+    app.scheduler = LLMScheduler(max_concurrency=1, max_queue=8, max_per_user=8)
+    chat_id = await create_long_chat()
+
+    running = app.scheduler.admit("user@example.com")
+    await wait_for_slot(app.scheduler, running)
+    summary = asyncio.create_task(summarize_chat(chat_id))
+    await asyncio.sleep(0.05)
+    assert llm.calls == 0
+    assert app.scheduler.stats()["queued_background"] == 1
+
+    app.scheduler.release(running)
+    await summary
+    assert llm.calls == 1
+    assert app.scheduler.stats()["running"] == 0
@@ -0,0 +1,99 @@
+import os
+import statistics
+import time
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from vectordb_handle import ensure_payload_indexes
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.skipif(
+        not os.environ.get("QDRANT_URL"),
+        reason="payload indexes need a Qdrant server, set QDRANT_URL",
+    ),
+]
+
+COLLECTION = "search_benchmark"
+POINTS = 100_000
+DOCUMENTS = 200
+BATCH = 2000
+SEARCHES = 200
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = QdrantClient(url=os.environ["QDRANT_URL"])
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=rest.VectorParams(size=384, distance=rest.Distance.COSINE),
+    )
+
+    rng = np.random.default_rng(0)
+    for start in range(0, POINTS, BATCH):
+        vectors = rng.standard_normal((BATCH, 384), dtype=np.float32)
+        client.upsert(
+            collection_name=COLLECTION,
+            points=rest.Batch(
+                ids=list(range(start, start + BATCH)),
+                vectors=vectors.tolist(),
+                payloads=[
+                    {"metadata": {"document_id": f"doc-{i % DOCUMENTS}"}}
+                    for i in range(start, start + BATCH)
+                ],
+            ),
+            wait=True,
+        )
+
+    yield client
+    client.delete_collection(COLLECTION)
+    client.close()
+
+
+# The filter a user with access to a few documents searches with.
+def search_latencies(client: QdrantClient) -> list[float]:
+    rng = np.random.default_rng(1)
+    query_filter = rest.Filter(
+        must=[
+            rest.FieldCondition(
+                key="metadata.document_id",
+                match=rest.MatchAny(any=[f"doc-{i}" for i in range(3)]),
+            )
+        ]
+    )
+
+    latencies = []
+    for _ in range(SEARCHES):
+        started = time.perf_counter()
+        client.query_points(
+            collection_name=COLLECTION,
+            query=rng.standard_normal(384).tolist(),
+            query_filter=query_filter,
+            limit=5,
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summary(latencies: list[float]) -> str:
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    return f"p50 {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms"
+
+
+def test_filtered_search_latency(client):
+    before = search_latencies(client)
+
+    assert ensure_payload_indexes(client, COLLECTION) == ["metadata.document_id"]
+    while client.get_collection(COLLECTION).status != rest.CollectionStatus.GREEN:
+        time.sleep(0.5)
+    after = search_latencies(client)
+
+    print(
+        f"\nFiltered search over {POINTS} points: "
+        f"{summary(before)} without index, {summary(after)} with index"
+    )
@@ -0,0 +1,39 @@
+import pytest
+
+from main import app, summarize_chat
+from models import Chat
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_long_chat() -> str:
+    chat = Chat(
+        title="chat",
+        user_email="user@example.com",
+        messages=[{"sender": "human", "message": f"m{i}"} for i in range(20)],
+        message_count=20,
+    )
+    result = await app.database["chats"].insert_one(chat.model_dump())
+    return str(result.inserted_id)
+
+
+async def test_summary_is_stored(client, llm):
+    llm.tokens = 3
+    chat_id = await create_long_chat()
+
+    await summarize_chat(chat_id)
+
+    chat = await app.database["chats"].find_one({})
+    assert chat["summary"] == "t0 t1 t2"
+    assert chat["summarized_count"] == 14
+
+
+async def test_summary_failure_is_logged(client, llm, capsys):
+    llm.error = RuntimeError("model crashed")
+    chat_id = await create_long_chat()
+
+    await summarize_chat(chat_id)
+
+    assert "Could not summarize chat" in capsys.readouterr().out
+    chat = await app.database["chats"].find_one({})
+    assert chat["summarized_count"] == 0
@@ -1 +1,6 @@
-from .encrypt_password import hash_password
+from .encrypt_password import (
+    hash_password,
+    hash_password_async,
+    verify_password,
+    password_hashing_stats,
+)
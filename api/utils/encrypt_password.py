@@ -1,8 +1,85 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 from decouple import config
 
+# bcrypt is deliberately slow; running it on the event loop would stall every
+# open chat stream for the duration of each login. A small dedicated pool
+# bounds how much CPU a login burst can take, the rest waits in its queue.
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+stats_lock = threading.Lock()
+hashing_stats = {
+    "submitted": 0,
+    "running": 0,
+    "completed": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
 
 def hash_password(password: str) -> str:
     salt = config("SALT")
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt.encode("utf-8"))
     return hashed.decode("utf-8")
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    # checkpw reads the salt from the stored hash and compares in constant time
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+async def run_in_password_executor(function, *args):
+    submitted_at = time.perf_counter()
+    with stats_lock:
+        hashing_stats["submitted"] += 1
+
+    def run():
+        wait = time.perf_counter() - submitted_at
+        with stats_lock:
+            hashing_stats["running"] += 1
+            hashing_stats["total_wait_seconds"] += wait
+            hashing_stats["max_wait_seconds"] = max(
+                hashing_stats["max_wait_seconds"], wait
+            )
+        try:
+            return function(*args)
+        finally:
+            with stats_lock:
+                hashing_stats["running"] -= 1
+                hashing_stats["completed"] += 1
+
+    return await asyncio.get_running_loop().run_in_executor(password_executor, run)
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_password_executor(hash_password, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await run_in_password_executor(check_password, password, hashed_password)
+
+
+def password_hashing_stats() -> dict:
+    with stats_lock:
+        stats = dict(hashing_stats)
+
+    started = stats["completed"] + stats["running"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "queued": stats["submitted"] - started,
+        "running": stats["running"],
+        "completed": stats["completed"],
+        "average_wait_seconds": stats["total_wait_seconds"] / started if started else 0.0,
+        "max_wait_seconds": stats["max_wait_seconds"],
+    }
@@ -1,2 +1,5 @@
-from .upsert_to_qdrant import upsert_pdf_to_qdrant
+from .upsert_to_qdrant import upsert_pdf_to_qdrant, replace_pdf_in_qdrant
 from .delete_from_qdrant import delete_document_from_qdrant
+from .query_embedding_cache import CachedQueryEmbeddings
+from .ingestion_jobs import IngestionJobQueue
+from .payload_indexes import ensure_payload_indexes, get_payload_index_status
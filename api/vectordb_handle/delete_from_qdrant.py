@@ -1,32 +1,29 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 
+from .upsert_to_qdrant import document_filter
 
+
+# Deletes with a server-side filter instead of scrolling ids into memory, so
+# documents of any size are removed completely in one request.
 def delete_document_from_qdrant(
     client: QdrantClient, collection_name: str, document_id: str
-):
-    search_result = client.scroll(
+) -> int:
+    points_to_delete = client.count(
         collection_name=collection_name,
-        scroll_filter=rest.Filter(
-            must=[
-                rest.FieldCondition(
-                    key="metadata.document_id", match=rest.MatchValue(value=document_id)
-                )
-            ]
-        ),
-        limit=10000,
-    )
-
-    points_to_delete = [point.id for point in search_result[0]]
+        count_filter=document_filter(document_id),
+        exact=True,
+    ).count
 
     if not points_to_delete:
         print(f"No vectors found for document: {document_id}")
-        return
+        return 0
 
     delete_result = client.delete(
         collection_name=collection_name,
-        points_selector=rest.PointIdsList(points=points_to_delete),
+        points_selector=rest.FilterSelector(filter=document_filter(document_id)),
     )
 
-    print(f"Deleted {len(points_to_delete)} vectors for document: {document_id}")
+    print(f"Deleted {points_to_delete} vectors for document: {document_id}")
     print(f"Delete operation status: {delete_result.status}")
+    return points_to_delete
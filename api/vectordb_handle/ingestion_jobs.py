@@ -0,0 +1,142 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+
+class IngestionJob:
+    def __init__(
+        self,
+        document_id: str,
+        title: str,
+        ingest: Callable,
+        on_finish: Optional[Callable[["IngestionJob"], Awaitable]] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.document_id = document_id
+        self.title = title
+        self.ingest = ingest
+        self.on_finish = on_finish
+
+        self.status = "queued"
+        self.error = None
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.chunks_reused = 0
+        self.chunks_deleted = 0
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    # Called from the worker thread; plain attribute writes are enough for
+    # the status endpoint to read a consistent-enough snapshot.
+    def report_progress(self, **progress):
+        for key, value in progress.items():
+            setattr(self, key, value)
+
+    def chunks_per_second(self) -> float:
+        if not self.started_at:
+            return 0.0
+
+        end = self.finished_at or datetime.now()
+        elapsed = (end - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return 0.0
+
+        return self.chunks_embedded / elapsed
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "document_id": self.document_id,
+            "title": self.title,
+            "status": self.status,
+            "error": self.error,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "chunks_deleted": self.chunks_deleted,
+            "chunks_per_second": round(self.chunks_per_second(), 2),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionJobQueue:
+    def __init__(self, workers: int = 2, max_finished_jobs: int = 1000):
+        self.workers = workers
+        self.max_finished_jobs = max_finished_jobs
+        self.queue = asyncio.Queue()
+        self.jobs = OrderedDict()
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(
+        self,
+        document_id: str,
+        title: str,
+        ingest: Callable,
+        on_finish: Optional[Callable[[IngestionJob], Awaitable]] = None,
+    ) -> IngestionJob:
+        job = IngestionJob(document_id, title, ingest, on_finish)
+        self.jobs[job.id] = job
+        self.queue.put_nowait(job)
+        self.forget_finished_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def forget_finished_jobs(self):
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            job.started_at = datetime.now()
+            started = time.perf_counter()
+
+            try:
+                # ingest() parses and embeds synchronously, so it runs in a
+                # thread; the number of workers bounds how many run at once.
+                await asyncio.to_thread(job.ingest, job.report_progress)
+                job.status = "completed"
+            except Exception as e:
+                print(f"Ingestion job {job.id} failed:", e)
+                job.status = "failed"
+                job.error = str(e)
+
+            job.finished_at = datetime.now()
+            print(
+                f"Ingestion job {job.id} {job.status} in "
+                f"{time.perf_counter() - started:.2f}s"
+            )
+
+            if job.on_finish:
+                try:
+                    await job.on_finish(job)
+                except Exception as e:
+                    print(f"Ingestion job {job.id} callback failed:", e)
+
+            self.queue.task_done()
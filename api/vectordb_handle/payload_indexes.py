@@ -0,0 +1,46 @@
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+# Every payload field used in a search or delete filter. Without an index
+# Qdrant has to check the payload of each candidate point.
+PAYLOAD_INDEXES = {
+    "metadata.document_id": rest.PayloadSchemaType.KEYWORD,
+}
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str) -> list[str]:
+    payload_schema = client.get_collection(collection_name).payload_schema or {}
+
+    created = []
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name in payload_schema:
+            continue
+
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+            wait=True,
+        )
+        created.append(field_name)
+
+    return created
+
+
+def get_payload_index_status(client: QdrantClient, collection_name: str) -> list[dict]:
+    payload_schema = client.get_collection(collection_name).payload_schema or {}
+
+    status = []
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        index_info = payload_schema.get(field_name)
+        status.append(
+            {
+                "field": field_name,
+                "expected_type": str(field_schema.value),
+                "indexed": index_info is not None,
+                "type": str(index_info.data_type.value) if index_info else None,
+                "points": index_info.points if index_info else None,
+            }
+        )
+
+    return status
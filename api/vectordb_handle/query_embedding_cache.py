@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    # all-MiniLM-L6-v2 is an uncased model, so lower-casing and collapsing
+    # whitespace doesn't change the resulting vector.
+    return " ".join(text.split()).lower()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, max_size: int = 1024):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # embed_query is called from executor threads by the async vector
+        # store methods, so the LRU bookkeeping has to be locked.
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = normalize_query(text)
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+
+            self.misses += 1
+
+        vector = self.embeddings.embed_query(key)
+
+        if self.max_size <= 0:
+            return vector
+
+        with self.lock:
+            self.cache[key] = vector
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+        return vector
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
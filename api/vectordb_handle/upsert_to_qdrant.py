@@ -1,39 +1,229 @@
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from decouple import config
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_qdrant import QdrantVectorStore
-from tqdm import tqdm
+from qdrant_client.http import models as rest
 
+EMBEDDING_BATCH_SIZE = config("EMBEDDING_BATCH_SIZE", default=128, cast=int)
+SCROLL_PAGE_SIZE = 1000
 
-def upsert_pdf_to_qdrant(
-    vector_store: QdrantVectorStore, pdf_path: str, document_id: str
-):
+
+def no_progress(**progress):
+    pass
+
+
+def document_filter(document_id: str) -> rest.Filter:
+    return rest.Filter(
+        must=[
+            rest.FieldCondition(
+                key="metadata.document_id", match=rest.MatchValue(value=document_id)
+            )
+        ]
+    )
+
+
+# Point ids are derived from the chunk content, so re-splitting an updated PDF
+# gives unchanged chunks the same ids they already have in Qdrant.
+def chunk_point_id(document_id: str, chunk_hash: str, occurrence: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}/{chunk_hash}/{occurrence}"))
+
+
+def load_pdf_chunks(
+    pdf_path: str, document_id: str, report_progress: Callable = no_progress
+) -> tuple[list[Document], list[str]]:
     print("Creating loader")
     loader = PyPDFLoader(pdf_path)
 
     print("Loading and splitting")
     documents = loader.load()
+    report_progress(pages_parsed=len(documents))
 
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000, chunk_overlap=0, length_function=len, is_separator_regex=False
     )
     texts = text_splitter.split_documents(documents)
+    report_progress(chunks_total=len(texts))
+
+    ids = []
+    occurrences = {}
+
+    # Add document_id to metadata for each chunk
+    for text in texts:
+        if not text.metadata:
+            text.metadata = {}
+        text.metadata["document_id"] = document_id  # Assign document_id
+        text.metadata["source"] = pdf_path  # Track the source file
+
+        chunk_hash = hashlib.sha256(text.page_content.encode("utf-8")).hexdigest()
+        text.metadata["chunk_hash"] = chunk_hash
+
+        # The same text can appear more than once in a document (headers,
+        # boilerplate), each copy still needs its own point.
+        occurrence = occurrences.get(chunk_hash, 0)
+        occurrences[chunk_hash] = occurrence + 1
+        ids.append(chunk_point_id(document_id, chunk_hash, occurrence))
+
+    return texts, ids
+
+
+def embed_and_upsert(
+    vector_store: QdrantVectorStore,
+    texts: list[Document],
+    ids: list[str],
+    report_progress: Callable = no_progress,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> int:
+    chunks_embedded = 0
+    pending_write = None
+
+    # Embedding is CPU bound and the Qdrant write is I/O, so each batch is
+    # written on a separate thread while the next one is being embedded.
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i : i + batch_size]
+            vectors = vector_store.embeddings.embed_documents(
+                [text.page_content for text in batch]
+            )
+            points = [
+                rest.PointStruct(
+                    id=point_id,
+                    vector={vector_store.vector_name: vector},
+                    payload={
+                        vector_store.content_payload_key: text.page_content,
+                        vector_store.metadata_payload_key: text.metadata,
+                    },
+                )
+                for point_id, text, vector in zip(ids[i : i + batch_size], batch, vectors)
+            ]
+
+            if pending_write:
+                pending_write.result()
+                report_progress(chunks_embedded=chunks_embedded)
+
+            pending_write = writer.submit(
+                vector_store.client.upsert,
+                collection_name=vector_store.collection_name,
+                points=points,
+            )
+            chunks_embedded += len(batch)
+
+        if pending_write:
+            pending_write.result()
+            report_progress(chunks_embedded=chunks_embedded)
 
-    # Create a progress bar
-    progress_bar = tqdm(total=len(texts), desc="Uploading documents", unit="doc")
+    return chunks_embedded
 
-    # Add metadata to each document chunk before uploading
-    for i in range(0, len(texts), 4):
-        batch = texts[i : i + 4]
 
-        # Add document_id to metadata for each chunk
-        for text in batch:
-            if not text.metadata:
-                text.metadata = {}
-            text.metadata["document_id"] = document_id  # Assign document_id
-            text.metadata["source"] = pdf_path  # Track the source file
+def get_document_point_ids(
+    vector_store: QdrantVectorStore, document_id: str
+) -> set[str]:
+    point_ids = set()
+    offset = None
 
-        vector_store.add_documents(batch)
-        progress_bar.update(len(batch))
+    while True:
+        points, offset = vector_store.client.scroll(
+            collection_name=vector_store.collection_name,
+            scroll_filter=document_filter(document_id),
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        point_ids.update(str(point.id) for point in points)
 
-    # Close the progress bar
-    progress_bar.close()
+        if offset is None:
+            return point_ids
+
+
+def upsert_pdf_to_qdrant(
+    vector_store: QdrantVectorStore,
+    pdf_path: str,
+    document_id: str,
+    report_progress: Optional[Callable] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+):
+    report_progress = report_progress or no_progress
+
+    texts, ids = load_pdf_chunks(pdf_path, document_id, report_progress)
+    return embed_and_upsert(vector_store, texts, ids, report_progress, batch_size)
+
+
+# Reused chunks keep their vectors but still carry the previous revision's
+# page and file. Chunks that share their new page metadata are updated with
+# one set_payload call, so this costs a request per page rather than per chunk.
+def update_reused_metadata(
+    vector_store: QdrantVectorStore,
+    texts: list[Document],
+    ids: list[str],
+    existing_ids: set[str],
+):
+    groups = {}
+    for text, point_id in zip(texts, ids):
+        if point_id not in existing_ids:
+            continue
+
+        metadata = {
+            key: value for key, value in text.metadata.items() if key != "chunk_hash"
+        }
+        groups.setdefault(tuple(sorted(metadata.items())), []).append(point_id)
+
+    for metadata, point_ids in groups.items():
+        for i in range(0, len(point_ids), SCROLL_PAGE_SIZE):
+            vector_store.client.set_payload(
+                collection_name=vector_store.collection_name,
+                payload=dict(metadata),
+                points=point_ids[i : i + SCROLL_PAGE_SIZE],
+                key=vector_store.metadata_payload_key,
+            )
+
+
+# Re-ingests an updated PDF for an existing document: only chunks whose hash
+# is new get embedded, and chunks that no longer exist are deleted.
+def replace_pdf_in_qdrant(
+    vector_store: QdrantVectorStore,
+    pdf_path: str,
+    document_id: str,
+    report_progress: Optional[Callable] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+):
+    report_progress = report_progress or no_progress
+
+    texts, ids = load_pdf_chunks(pdf_path, document_id, report_progress)
+    existing_ids = get_document_point_ids(vector_store, document_id)
+
+    new_texts = []
+    new_ids = []
+    for text, point_id in zip(texts, ids):
+        if point_id not in existing_ids:
+            new_texts.append(text)
+            new_ids.append(point_id)
+
+    vanished_ids = list(existing_ids - set(ids))
+    report_progress(chunks_reused=len(texts) - len(new_texts))
+
+    chunks_embedded = embed_and_upsert(
+        vector_store, new_texts, new_ids, report_progress, batch_size
+    )
+
+    for i in range(0, len(vanished_ids), SCROLL_PAGE_SIZE):
+        vector_store.client.delete(
+            collection_name=vector_store.collection_name,
+            points_selector=rest.PointIdsList(
+                points=vanished_ids[i : i + SCROLL_PAGE_SIZE]
+            ),
+        )
+    report_progress(chunks_deleted=len(vanished_ids))
+
+    update_reused_metadata(vector_store, texts, ids, existing_ids)
+
+    print(
+        f"Re-ingested {document_id}: {chunks_embedded} embedded, "
+        f"{len(texts) - len(new_texts)} reused, {len(vanished_ids)} deleted"
+    )
+    return chunks_embedded
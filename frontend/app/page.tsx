@@ -198,52 +198,57 @@ export default function Home() {
         setMessageState({ isGenerating: false, message: currentMessage });
       };
 
-      // @ts-ignore
-      eventSource.onclose = async () => {
-        try {
-          currentMessage = currentMessage.replace(
-            "<think>",
-            "<div class='thinking' data-state='closed'>"
-          );
-          currentMessage = currentMessage.replace("</think>", "</div>");
-          currentMessage = currentMessage.replace(
-            "<div class='thinking' data-state='open'>",
-            "<div class='thinking' data-state='closed'>"
-          );
-
-          console.log(currentMessage);
-
-          await axios.post(
-            `${process.env.NEXT_PUBLIC_API_URL}/update-chat`,
-            { chat_id: id, full_message: currentMessage.trim() },
-            {
-              headers: {
-                Authorization: `Bearer ${token}`,
-              },
-            }
-          );
+      // The server stores the answer itself once it is complete, so the
+      // stream only has to be shown.
+      const finish = () => {
+        currentMessage = currentMessage.replace(
+          "<think>",
+          "<div class='thinking' data-state='closed'>"
+        );
+        currentMessage = currentMessage.replace("</think>", "</div>");
+        currentMessage = currentMessage.replace(
+          "<div class='thinking' data-state='open'>",
+          "<div class='thinking' data-state='closed'>"
+        );
 
+        if (currentMessage.trim()) {
           addNewMessage({
             message: currentMessage,
             sender: "ai",
           });
-
-          setMessageState({ isGenerating: false, message: "" });
-          setIsGenerating(false);
-        } catch (error: any) {
-          toast.error(error.response?.data?.message || "An error occurred");
-          console.log(error);
         }
+
+        setMessageState({ isGenerating: false, message: "" });
+        setIsGenerating(false);
       };
 
-      eventSource.onerror = (error) => {
-        console.error("EventSource failed:", error);
+      eventSource.addEventListener("done", (event) => {
         eventSource.close();
-        // @ts-ignore
-        error.target.onclose();
 
-        setMessageState({ isGenerating: false, message: "" });
-        setIsGenerating(false);
+        const data = JSON.parse((event as MessageEvent).data);
+        if (!data.success) {
+          toast.error(data.message || "An error occurred");
+        }
+
+        finish();
+      });
+
+      // While the connection is only interrupted EventSource reconnects on
+      // its own with Last-Event-ID and the server resumes the stream.
+      eventSource.onerror = (error) => {
+        if (eventSource.readyState !== EventSource.CLOSED) {
+          console.warn("EventSource reconnecting:", error);
+          return;
+        }
+
+        // The stream ended without a "done" event: the server refused it
+        // (busy, or a reply already running for this chat) or the answer
+        // can no longer be resumed. EventSource doesn't expose the status.
+        console.error("EventSource failed:", error);
+        toast.error(
+          "Could not get a response. Reload the chat or try again in a moment."
+        );
+        finish();
       };
     } catch (error: any) {
       toast.error(error.response?.data?.message || "An error occurred");